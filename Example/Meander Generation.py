@@ -2,6 +2,7 @@
 
 
 import src.dc6006l_class as ps
+from src.dc6006l_sequence import pulse_train
 #import dc6006l_class as ps
 import time
 
@@ -32,6 +33,7 @@ if __name__ == "__main__":
     power.set_v_out(Vout_high)
     for x in range(0, Nreps):
         power.output_enable()
+        print(f" Switch latency: {power.last_switch_latency} s")
         time.sleep(on_pulse_width)
         print(f" OnTime:{on_pulse_width} s, State: {power.get_state()}")
 
@@ -39,6 +41,10 @@ if __name__ == "__main__":
         time.sleep(off_pulse_width)
         print(f"OffTime:{off_pulse_width} s, State: {power.get_state()}")
 
+    # the same pulses with absolute deadlines, no confirmation between edges
+    result = pulse_train(power, on_pulse_width, off_pulse_width, Nreps, voltage=Vout_high)
+    print(f"Pulse widths from telemetry: {result['on_widths']}")
+
 
     power.output_disable()
     power.close()
\ No newline at end of file
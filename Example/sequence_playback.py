@@ -0,0 +1,30 @@
+# example of drift-free waveform playback with dc6006l_sequence.
+
+
+import src.dc6006l_class as ps
+import src.dc6006l_sequence as sq
+
+if __name__ == "__main__":
+    Vout_high = 5  # voltage of high level, here 5V
+    Vout_low = 0
+    Nreps = 10
+    on_pulse_width = 0.5  # time in second
+    off_pulse_width = 0.8  # time in seconds
+
+    power = ps.dc6006l_class()
+    result = power.init('/dev/ttyUSB0')  # linux variant
+    power.enable_state_reporting()
+    power.output_disable()
+
+    steps = [(0.0, Vout_low, 1, 1)]
+    steps += [(t + 0.1, v, i, out) for t, v, i, out in
+              sq.meander(Vout_high, Vout_low, on_pulse_width, off_pulse_width, Nreps)]
+    seq = sq.compile_sequence(steps)
+    result = sq.play_sequence(power, seq, capture=True)
+    print(f"Duration: {result['duration']:.3f} s, nominal: {result['nominal']:.3f} s")
+    print(f"Max step delay: {max(result['late']) * 1000:.1f} ms, commands: {result['sent']}")
+    for sample in result["samples"]:
+        print(sample)
+
+    power.output_disable()
+    power.close()
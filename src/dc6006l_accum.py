@@ -0,0 +1,187 @@
+# Streaming accumulators of telemetry: energy/charge, windowed min/max/mean/RMS
+# and time in CC/CV and error states. Every sample is folded in O(1)
+# (amortized for the window min/max), raw samples are not stored.
+#
+# usage:
+#     acc = telemetry_accumulator(window=10.0)
+#     acc.attach(power)            # power streaming, see enable_state_reporting()
+#     ...
+#     print(acc.snapshot()["wh"], acc.snapshot()["window"]["i_out"]["rms"])
+#     acc.reset()
+#
+
+import collections
+import math
+import threading
+
+try:
+    from . import dc6006l_class as ps
+except ImportError:
+    import dc6006l_class as ps
+
+ERROR_NAMES = {0: "ok", 1: "ov", 2: "oc", 3: "ot"}
+MODE_NAMES = {0: "cv", 1: "cc"}
+
+
+class window_stats:
+    # min/max/mean/RMS of one field over the last `window` seconds.
+    # Sums are updated on entry/exit, min/max come from monotonic deques
+    def __init__(self, window):
+        self.window = window
+        self.reset()
+
+    def reset(self):
+        self._items = collections.deque()  # (t, x)
+        self._min = collections.deque()
+        self._max = collections.deque()
+        self._sum = 0.0
+        self._sq = 0.0
+
+    def add(self, t, x):
+        self._items.append((t, x))
+        self._sum += x
+        self._sq += x * x
+        while self._min and self._min[-1][1] > x:
+            self._min.pop()
+        self._min.append((t, x))
+        while self._max and self._max[-1][1] < x:
+            self._max.pop()
+        self._max.append((t, x))
+        t_old = t - self.window
+        items = self._items
+        while items[0][0] < t_old:
+            _, y = items.popleft()
+            self._sum -= y
+            self._sq -= y * y
+        while self._min[0][0] < t_old:
+            self._min.popleft()
+        while self._max[0][0] < t_old:
+            self._max.popleft()
+
+    def snapshot(self):
+        n = len(self._items)
+        if not n:
+            return {"n": 0, "min": None, "max": None, "mean": None, "rms": None}
+        return {
+            "n": n,
+            "min": self._min[0][1],
+            "max": self._max[0][1],
+            "mean": self._sum / n,
+            "rms": math.sqrt(max(0.0, self._sq / n)),
+        }
+
+
+class telemetry_accumulator:
+    def __init__(self, window=10.0, fields=("v_out", "i_out", "p_out"), max_gap=1.0):
+        # window - s of windowed statistics of fields
+        # max_gap - s, longer pauses between samples (lost frames, streaming off)
+        # are not integrated and not added to state durations
+        self.window = window
+        self.fields = tuple(fields)
+        self.max_gap = max_gap
+        self._lock = threading.Lock()
+        self._follower = None
+        self._windows = {f: window_stats(window) for f in self.fields}
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._prev = None
+            self.samples = 0
+            self.gaps = 0
+            self.lost = 0
+            self.t_first = None
+            self.duration = 0.0  # s of integrated time
+            self.energy = 0.0  # J
+            self.charge = 0.0  # C
+            self._total = {f: [0.0, None, None] for f in self.fields}  # sum, min, max
+            self.mode_time = {name: 0.0 for name in MODE_NAMES.values()}
+            self.mode_count = {name: 0 for name in MODE_NAMES.values()}
+            self.error_time = {name: 0.0 for name in ERROR_NAMES.values()}
+            self.error_count = {name: 0 for name in ERROR_NAMES.values()}
+            for w in self._windows.values():
+                w.reset()
+
+    def update(self, sample):
+        # sample - State of state_ring
+        with self._lock:
+            self._update(sample)
+
+    def extend(self, samples):
+        with self._lock:
+            for sample in samples:
+                self._update(sample)
+
+    def _update(self, s):
+        t = s.timestamp
+        prev = self._prev
+        self.samples += 1
+        mode = MODE_NAMES.get(s.cv_cc, "cv")
+        error = ERROR_NAMES.get(s.error, "ok")
+        if prev is None:
+            self.t_first = t
+            self.mode_count[mode] += 1
+            self.error_count[error] += 1
+        else:
+            dt = t - prev.timestamp
+            if dt > self.max_gap or dt < 0:
+                self.gaps += 1
+            else:
+                # trapezoidal integration with the actual time between frames,
+                # states are held from the previous frame
+                self.duration += dt
+                self.energy += 0.5 * (prev.p_out + s.p_out) * dt
+                self.charge += 0.5 * (prev.i_out + s.i_out) * dt
+                self.mode_time[MODE_NAMES.get(prev.cv_cc, "cv")] += dt
+                self.error_time[ERROR_NAMES.get(prev.error, "ok")] += dt
+            if s.cv_cc != prev.cv_cc:
+                self.mode_count[mode] += 1
+            if s.error != prev.error:
+                self.error_count[error] += 1
+        for f in self.fields:
+            x = getattr(s, f)
+            total = self._total[f]
+            total[0] += x
+            total[1] = x if total[1] is None else min(total[1], x)
+            total[2] = x if total[2] is None else max(total[2], x)
+            self._windows[f].add(t, x)
+        self._prev = s
+
+    def snapshot(self):
+        # live totals; mode_count/error_count - number of entries into a state
+        with self._lock:
+            n = self.samples
+            return {
+                "samples": n,
+                "lost": self.lost,
+                "gaps": self.gaps,
+                "start_time": self.t_first,
+                "duration": self.duration,
+                "energy": self.energy,
+                "wh": self.energy / 3600,
+                "charge": self.charge,
+                "ah": self.charge / 3600,
+                "total": {f: {"min": t[1], "max": t[2], "mean": t[0] / n if n else None}
+                          for f, t in self._total.items()},
+                "window": {f: w.snapshot() for f, w in self._windows.items()},
+                "mode_time": dict(self.mode_time),
+                "mode_count": dict(self.mode_count),
+                "error_time": dict(self.error_time),
+                "error_count": dict(self.error_count),
+            }
+
+    def attach(self, source, period=0.1):
+        # folds every sample of source.ring (dc6006l_class with streaming on,
+        # recording_replay) from a background thread
+        self._follower = ps.ring_follower(source, self._follow, period, "dc6006l_accum")
+
+    def _follow(self, samples, lost):
+        with self._lock:
+            self.lost += lost
+            for sample in samples:
+                self._update(sample)
+
+    def detach(self):
+        if self._follower is not None:
+            self._follower.stop()
+            self._follower = None
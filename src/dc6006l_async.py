@@ -0,0 +1,288 @@
+# asyncio client for DC6006L, the same operations as dc6006l_class.
+# Serial port is read from the event loop (non-blocking fd on Linux, polling
+# elsewhere), so one loop can command and monitor many supplies at once:
+#
+#     supplies = [AsyncDC6006L() for port in ports]
+#     await asyncio.gather(*(s.open(port) for s, port in zip(supplies, ports)))
+#     await asyncio.gather(*(s.set_v_out(5) for s in supplies))
+#
+
+import asyncio
+import time
+
+import serial
+import serial.tools.list_ports
+
+try:
+    from . import dc6006l_class as ps
+except ImportError:
+    import dc6006l_class as ps
+
+
+class AsyncDC6006L:
+    def __init__(self, ring_size=4096):
+        self.ser = None
+        self.ring = ps.state_ring(ring_size)
+        self.reply_timeout = 0.5
+        self.idle_gap = 0.01
+        self.output_timeout = 1.0
+        self._loop = None
+        self.parser = ps.frame_parser()
+        self._idle_handle = None
+        self._poll_task = None
+        self._reader_fd = None
+        self._lock = None
+        self._waiter = None  # (kind, t_cmd, future)
+        self._report_event = None
+        self.read_error = None  # port error that stopped reading, see _on_readable
+
+    async def open(self, com_port, check_port=True, reporting=True):
+        if check_port:
+            com_port_list = [comport.device for comport in serial.tools.list_ports.comports()]
+            if com_port not in com_port_list:
+                print(f"Please check COM port Number. Currently it is {com_port} ")
+                print(f'Founded COM ports:{com_port_list}')
+                return False
+        self._loop = asyncio.get_running_loop()
+        self._lock = asyncio.Lock()
+        self._report_event = asyncio.Event()
+        self.read_error = None
+        try:
+            self.ser = serial.Serial(port=com_port, baudrate=115200, timeout=0, exclusive=True)
+        except serial.SerialException as e:
+            print(f"{ps.bcolors.FAIL}Can not open {com_port}: {e}{ps.bcolors.ENDC}")
+            return False
+        try:
+            self._loop.add_reader(self.ser.fileno(), self._on_readable)
+            self._reader_fd = self.ser.fileno()
+        except (NotImplementedError, AttributeError):
+            # no fd based reader (Windows), poll the port from a task
+            self._poll_task = self._loop.create_task(self._poll())
+        if reporting:
+            await self.enable_state_reporting()
+        return True
+
+    async def close(self):
+        if self.ser is None:
+            return
+        self._stop_reading()
+        if self._idle_handle is not None:
+            self._idle_handle.cancel()
+        self.ser.close()
+        self.ser = None
+
+    # --- transport ---
+
+    def _stop_reading(self):
+        if self._poll_task is not None:
+            if self._poll_task is not asyncio.current_task(self._loop):
+                self._poll_task.cancel()
+            self._poll_task = None
+        elif self._reader_fd is not None:
+            self._loop.remove_reader(self._reader_fd)
+            self._reader_fd = None
+
+    async def _poll(self):
+        while self._poll_task is not None:
+            try:
+                waiting = self.ser.in_waiting
+            except (serial.SerialException, OSError) as e:
+                self._read_failed(e)
+                break
+            if waiting:
+                self._on_readable()
+            await asyncio.sleep(0.001)
+
+    def _on_readable(self):
+        try:
+            chunk = self.ser.read(self.ser.in_waiting or 1)
+        except (serial.SerialException, OSError) as e:
+            self._read_failed(e)
+            return
+        if chunk:
+            self._feed(chunk, idle=False)
+
+    def _read_failed(self, e):
+        # the port is gone: stop reading, or the fd reader fires again at once,
+        # and wake up the waiters instead of letting them time out
+        print(f"{ps.bcolors.FAIL}{self.ser.port}: read error {e}{ps.bcolors.ENDC}")
+        self.read_error = e
+        self._stop_reading()
+        if self._idle_handle is not None:
+            self._idle_handle.cancel()
+            self._idle_handle = None
+        if self._waiter is not None and not self._waiter[2].done():
+            self._waiter[2].set_result("")
+        self._report_event.set()
+
+    def _on_idle(self):
+        self._idle_handle = None
+        self._feed(b"", idle=True)
+
+    def _feed(self, chunk, idle):
+        now = time.time()
+        for t, kind, frame in self.parser.feed(chunk, idle):
+            if kind == "report":
+                self.ring.push(ps.decode_report(frame, now))
+                self._report_event.set()
+                self._report_event = asyncio.Event()
+            elif self._waiter is not None:
+                want, t_cmd, fut = self._waiter
+                if kind == want and t >= t_cmd and not fut.done():
+                    fut.set_result(frame.decode())
+        if self._idle_handle is not None:
+            self._idle_handle.cancel()
+            self._idle_handle = None
+        if self.parser.pending():
+            # partial frame, closed when the line is quiet
+            self._idle_handle = self._loop.call_later(self.idle_gap, self._on_idle)
+
+    def send(self, cmd_str):
+        self.ser.write(f'{cmd_str}\r\n'.encode())
+
+    async def query_frame(self, cmd_str, kind="echo", timeout=None):
+        # sends command and waits for the first complete replay frame of given kind
+        # returns frame as str, "" on timeout
+        if timeout is None:
+            timeout = self.reply_timeout
+        if self.read_error is not None:
+            return ""
+        async with self._lock:
+            fut = self._loop.create_future()
+            self._waiter = (kind, time.monotonic(), fut)
+            self.send(cmd_str)
+            try:
+                return await asyncio.wait_for(fut, timeout)
+            except asyncio.TimeoutError:
+                return ""
+            finally:
+                self._waiter = None
+
+    async def next_state(self, timeout=None):
+        # waits for the next periodic report, returns State, None on timeout or read error
+        if timeout is None:
+            timeout = self.reply_timeout
+        if self.read_error is not None:
+            return None
+        try:
+            await asyncio.wait_for(self._report_event.wait(), timeout)
+        except asyncio.TimeoutError:
+            return None
+        if self.read_error is not None:
+            return None
+        return self.ring.latest()
+
+    # --- public API, the same as dc6006l_class ---
+
+    async def enable_state_reporting(self):
+        self.send("Q")
+
+    async def disable_state_reporting(self):
+        self.send("W")
+
+    async def set_v_out(self, voltage):
+        voltage, txt = ps.v_out_cmd(voltage)
+        read_back = await self.query_frame(txt, "echo")
+        if read_back == "":
+            print(f"{self.ser.port}: no replay to {txt}")
+            return False
+        v_out, i_out = [int(x) for x in read_back.split("A")[:2]]
+        v_out = v_out / 100
+        if abs(v_out - voltage) > 0.1:
+            print("Something wrong while setting voltage. Set and read back value mismatch")
+            print(f" Vset: {voltage} Vget: {v_out}, Iget: {i_out / 1000}")
+            return False
+        return True
+
+    async def set_i_out(self, current):
+        current, txt = ps.i_out_cmd(current)
+        read_back = await self.query_frame(txt, "echo")
+        if read_back == "":
+            print(f"{self.ser.port}: no replay to {txt}")
+            return False
+        v_out, i_out = [int(x) for x in read_back.split("A")[:2]]
+        i_out = i_out / 1000
+        if current != i_out:
+            print("Something wrong while setting current. Set and read back value mismatch")
+            print(f" Iset: {current} Vget: {v_out / 100}, Iget: {i_out}")
+            return False
+        return True
+
+    async def _switch_output(self, cmd, on_off, timeout):
+        if timeout is None:
+            timeout = self.output_timeout
+        deadline = time.monotonic() + timeout
+        async with self._lock:
+            self.send(cmd)
+        while True:
+            left = deadline - time.monotonic()
+            if left <= 0:
+                return False
+            state = await self.next_state(left)
+            if state is not None and state.on_off == on_off:
+                return True
+
+    async def output_enable(self, timeout=None):
+        # confirmed by the first report with output on
+        return await self._switch_output("N", 1, timeout)
+
+    async def output_disable(self, timeout=None):
+        return await self._switch_output("F", 0, timeout)
+
+    async def get_state(self):
+        sample = self.ring.latest()
+        if sample is None:
+            return await self.next_state()
+        return sample
+
+    async def get_status(self, var_name="none"):
+        # "KB" status replay is sent by the supply after "Q"
+        txt = await self.query_frame("Q", "status")
+        if txt == "":
+            # some firmware answers only when reporting starts, restart it once
+            async with self._lock:
+                self.send("W")
+            txt = await self.query_frame("Q", "status")
+        if txt == "":
+            print(f"Get_status. No status replay on {self.ser.port}")
+            return False
+        status = ps.decode_status(txt, time.time())
+        if var_name == "none":
+            return status
+        return status[var_name]
+
+    async def apply_config(self, config=None, verify=True, **fields):
+        # the same transaction as dc6006l_class.apply_config()
+        config = dict(config or {}, **fields)
+        cmds = ps.config_cmds(config)
+        async with self._lock:
+            for _, _, txt in cmds:
+                self.send(txt)
+        if not verify:
+            return {"ok": True, "failed": {}, "status": None}
+        status = await self.get_status() or None
+        failed = ps.check_config(cmds, status)
+        if status is not None and failed:
+            # can be the late replay to an earlier "Q", read once more
+            status = await self.get_status() or None
+            failed = ps.check_config(cmds, status)
+        return {"ok": not failed, "failed": failed, "status": status}
+
+    async def set_volt_protect(self, voltage):
+        return (await self.apply_config(v_lim=voltage))["ok"]
+
+    async def set_current_protect(self, current):
+        return (await self.apply_config(i_lim=current))["ok"]
+
+    async def set_power_protect(self, power):
+        return (await self.apply_config(p_lim=power))["ok"]
+
+    async def set_time_protect(self, hours, minutes, seconds):
+        return (await self.apply_config(timeout_hh=hours, timeout_mm=minutes,
+                                        timeout_ss=seconds))["ok"]
+
+    async def time_protect_enable(self):
+        return (await self.apply_config(timeout_en=True))["ok"]
+
+    async def time_protect_disable(self):
+        return (await self.apply_config(timeout_en=False))["ok"]
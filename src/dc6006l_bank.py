@@ -0,0 +1,160 @@
+# Bank of dc6006l_class supplies driven in parallel from a thread pool.
+# Every worker prepares its command and waits on a common barrier, so the
+# writes of all channels are released at the same moment. Per-device write
+# time stamps (taken when the command left the driver) give the channel skew.
+#
+# usage:
+#     bank = SupplyBank({"ch1": "/dev/ttyUSB0", "ch2": "/dev/ttyUSB1"})
+#     res = bank.set_all(v=5, i=1)
+#     print(res["ok"], res["skew"])
+#     bank.close()
+#
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    from . import dc6006l_class as ps
+except ImportError:
+    import dc6006l_class as ps
+
+
+class SupplyBank:
+    def __init__(self, ports=None, supplies=None, check_port=True, streaming=True):
+        # ports - {name: com_port}, supplies - {name: already opened dc6006l_class}
+        self.supplies = dict(supplies or {})
+        for name, port in (ports or {}).items():
+            power = ps.dc6006l_class()
+            if not power.init(port, check_port):
+                print(f"{ps.bcolors.FAIL}{name}: can not open {port}{ps.bcolors.ENDC}")
+                continue
+            if streaming:
+                power.enable_state_reporting()
+            self.supplies[name] = power
+        self._pool = ThreadPoolExecutor(max_workers=max(1, len(self.supplies)),
+                                        thread_name_prefix="dc6006l_bank")
+
+    def __len__(self):
+        return len(self.supplies)
+
+    def __getitem__(self, name):
+        return self.supplies[name]
+
+    def close(self):
+        self._pool.shutdown()
+        for power in self.supplies.values():
+            if power.ser is not None:
+                power.close()
+
+    def _fan_out(self, job, names=None):
+        # job(power, release, written) runs for every device; release() waits for all
+        # workers, written() is called after the first command and stamps the write
+        # with time.monotonic() of power._write_cmd()
+        names = list(self.supplies) if names is None else list(names)
+        if not names:
+            # no device opened (or selected), nothing is confirmed
+            return {"ok": False, "devices": {}, "skew": None, "duration": 0.0}
+        barrier = threading.Barrier(len(names))
+
+        def run(name):
+            power = self.supplies[name]
+            t_write = None
+
+            def written():
+                nonlocal t_write
+                if t_write is None:
+                    t_write = power._last_cmd_time
+
+            try:
+                ok = job(power, barrier.wait, written)
+            except Exception as e:
+                barrier.abort()
+                print(f"{ps.bcolors.FAIL}{name}: {e}{ps.bcolors.ENDC}")
+                ok = False
+            return ok, t_write, time.monotonic()
+
+        t_start = time.monotonic()
+        futures = {name: self._pool.submit(run, name) for name in names}
+        results = {name: f.result() for name, f in futures.items()}
+        return self._summary(results, t_start)
+
+    @staticmethod
+    def _summary(results, t_start):
+        writes = [r[1] for r in results.values() if r[1] is not None]
+        t0 = min(writes) if writes else t_start
+        devices = {}
+        for name, (ok, t_write, t_done) in results.items():
+            devices[name] = {
+                "ok": bool(ok),
+                "write_offset": None if t_write is None else t_write - t0,
+                "latency": t_done - (t_start if t_write is None else t_write),
+            }
+        return {
+            "ok": all(d["ok"] for d in devices.values()),
+            "devices": devices,
+            # time between the first and the last write of the bank
+            "skew": max(writes) - min(writes) if writes else None,
+            "duration": max((r[2] for r in results.values()), default=t_start) - t_start,
+        }
+
+    def set_all(self, v=None, i=None, names=None):
+        # sets voltage and/or current on all devices, returns per-device confirmation and skew
+        def job(power, release, written):
+            cmds = []
+            if v is not None:
+                cmds.append(ps.v_out_cmd(v))
+            if i is not None:
+                cmds.append(ps.i_out_cmd(i))
+            release()
+            ok = True
+            for value, cmd in cmds:
+                read_back = power.query_frame(cmd, "echo")
+                written()
+                if read_back == "":
+                    ok = False
+                    continue
+                v_set, i_set = [int(x) for x in read_back.split("A")[:2]]
+                if cmd[0] == "V":
+                    ok = ok and abs(v_set / 100 - value) <= 0.1
+                else:
+                    ok = ok and i_set / 1000 == value
+            return ok
+        return self._fan_out(job, names)
+
+    def _switch_all(self, cmd, on_off, names, timeout):
+        def job(power, release, written):
+            release()
+            power.send(cmd)
+            written()
+            return self._wait_output(power, on_off, timeout)
+        return self._fan_out(job, names)
+
+    @staticmethod
+    def _wait_output(power, on_off, timeout):
+        deadline = time.monotonic() + timeout
+        if power.is_streaming():
+            seq = power.ring.count()
+            while time.monotonic() < deadline:
+                samples = power.ring.read_from(seq)[0]
+                seq += len(samples)
+                if any(s.on_off == on_off for s in samples):
+                    return True
+                time.sleep(0.002)
+            return False
+        while time.monotonic() < deadline:
+            state = power.get_state()
+            if state is not None and state["Output"] == on_off:
+                return True
+        return False
+
+    def enable_all(self, names=None, timeout=1.0):
+        return self._switch_all("N", 1, names, timeout)
+
+    def disable_all(self, names=None, timeout=1.0):
+        return self._switch_all("F", 0, names, timeout)
+
+    def get_states(self):
+        # latest state of every device
+        futures = {name: self._pool.submit(p.get_state) for name, p in self.supplies.items()}
+        return {name: f.result() for name, f in futures.items()}
@@ -0,0 +1,98 @@
+# Vectorized decoding of captured periodic reports with NumPy.
+# Raw capture (thousands of concatenated 27 byte reports, possibly with replays
+# and damaged frames in between) is decoded in one pass into a structured array.
+#
+# usage:
+#     data = open("capture.bin", "rb").read()
+#     states = decode_reports(data, t0=0.0, period=0.05)
+#     print(states["v_out"].mean(), states["i_out"].max())
+#
+
+import numpy as np
+
+try:
+    from .dc6006l_class import REPORT_LEN, REPORT_A_POS, STATE_FIELDS
+except ImportError:
+    from dc6006l_class import REPORT_LEN, REPORT_A_POS, STATE_FIELDS
+
+STATE_DTYPE = np.dtype([
+    ("v_out", np.float64),
+    ("i_out", np.float64),
+    ("p_out", np.float64),
+    ("temp", np.int16),
+    ("cv_cc", np.int8),
+    ("error", np.int8),
+    ("on_off", np.int8),
+    ("timestamp", np.float64),
+])
+
+
+def report_mask(data):
+    # True at every offset where a complete valid report starts
+    arr = np.frombuffer(data, dtype=np.uint8)
+    n = len(arr) - REPORT_LEN + 1
+    if n <= 0:
+        return np.zeros(0, dtype=bool)
+    is_a = arr == 0x41
+    is_digit = (arr >= 0x30) & (arr <= 0x39)
+    mask = np.ones(n, dtype=bool)
+    for k in range(REPORT_LEN):
+        mask &= (is_a if k in REPORT_A_POS else is_digit)[k:k + n]
+    return mask
+
+
+def _non_overlapping(starts):
+    # valid reports can not overlap, false matches inside damaged data can
+    if len(starts) < 2 or np.all(np.diff(starts) >= REPORT_LEN):
+        return starts
+    keep = []
+    last = -REPORT_LEN
+    for s in starts.tolist():
+        if s - last >= REPORT_LEN:
+            keep.append(s)
+            last = s
+    return np.array(keep, dtype=starts.dtype)
+
+
+def _number(digits, starts, offset, width):
+    val = np.zeros(len(starts), dtype=np.int64)
+    for k in range(width):
+        val = val * 10 + digits[starts + offset + k]
+    return val
+
+
+def decode_reports(data, t0=None, period=None, timestamps=None):
+    # data - bytes/bytearray/memoryview with concatenated reports
+    # timestamps - one time stamp per decoded frame, or
+    # t0 + period: time stamp from frame position in the capture (gaps of
+    # malformed frames are kept), otherwise timestamp is nan.
+    # returns structured array STATE_DTYPE, the same values as decode_report()
+    starts = _non_overlapping(np.flatnonzero(report_mask(data)))
+    digits = np.frombuffer(data, dtype=np.uint8).astype(np.int64) - 0x30
+    out = np.empty(len(starts), dtype=STATE_DTYPE)
+    out["v_out"] = _number(digits, starts, 0, 4) / 100
+    out["i_out"] = _number(digits, starts, 5, 4) / 1000
+    out["p_out"] = _number(digits, starts, 10, 4) / 100
+    out["temp"] = _number(digits, starts, 17, 3)
+    out["cv_cc"] = digits[starts + 21]
+    out["error"] = digits[starts + 23]
+    out["on_off"] = digits[starts + 25]
+    if timestamps is not None:
+        out["timestamp"] = timestamps
+    elif period is not None:
+        out["timestamp"] = (0.0 if t0 is None else t0) + (starts // REPORT_LEN) * period
+    else:
+        out["timestamp"] = np.nan
+    return out
+
+
+def samples_to_array(samples):
+    # list of State (state_ring samples) -> STATE_DTYPE array
+    out = np.empty(len(samples), dtype=STATE_DTYPE)
+    if not len(samples):
+        return out
+    a = np.asarray(samples, dtype=np.float64)
+    for k, field in enumerate(STATE_FIELDS):
+        if field in STATE_DTYPE.names:
+            out[field] = a[:, k]
+    return out
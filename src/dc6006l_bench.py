@@ -0,0 +1,108 @@
+# Latency/throughput benchmark of dc6006l_class public API against dc6006l_sim.
+# No hardware needed, runs on Linux (pseudo-terminal).
+#
+# run from repository root:
+#     python -m src.dc6006l_bench
+#     python -m src.dc6006l_bench --n 500 --json bench.json
+#
+
+import argparse
+import json
+import time
+
+try:
+    from . import dc6006l_class as ps
+    from .dc6006l_sim import dc6006l_sim
+except ImportError:
+    import dc6006l_class as ps
+    from dc6006l_sim import dc6006l_sim
+
+
+def percentile(values, p):
+    if not values:
+        return None
+    values = sorted(values)
+    k = min(len(values) - 1, max(0, int(round(p / 100 * (len(values) - 1)))))
+    return values[k]
+
+
+def latency_stats(name, latencies, total_time):
+    return {
+        "name": name,
+        "n": len(latencies),
+        "cmd_per_s": len(latencies) / total_time if total_time else None,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "max_ms": max(latencies) * 1000,
+    }
+
+
+def bench_calls(name, func, args_list):
+    latencies = []
+    t_start = time.perf_counter()
+    for args in args_list:
+        t0 = time.perf_counter()
+        func(*args)
+        latencies.append(time.perf_counter() - t0)
+    return latency_stats(name, latencies, time.perf_counter() - t_start)
+
+
+def run(n=200, telemetry_time=2.0, sim_kwargs=None):
+    results = []
+    voltages = [(round(1 + (k % 100) / 10, 2),) for k in range(n)]
+    currents = [(round(0.1 + (k % 50) / 100, 3),) for k in range(n)]
+    with dc6006l_sim(**(sim_kwargs or {})) as sim:
+        power = ps.dc6006l_class()
+        power.init(sim.port, check_port=False)
+        power.disable_state_reporting()
+
+        results.append(bench_calls("set_v_out", power.set_v_out, voltages))
+        results.append(bench_calls("set_i_out", power.set_i_out, currents))
+        power.enable_state_reporting(streaming=False)
+        results.append(bench_calls("get_state (polled)", lambda: power.get_state(), [()] * 20))
+        power.disable_state_reporting()
+
+        power.enable_state_reporting()
+        results.append(bench_calls("set_v_out (streaming)", power.set_v_out, voltages))
+        results.append(bench_calls("get_state (streaming)", lambda: power.get_state(), [()] * n))
+
+        start = power.ring.count()
+        time.sleep(telemetry_time)
+        frames = power.ring.count() - start
+        results.append({
+            "name": "telemetry",
+            "frames": frames,
+            "frames_per_s": frames / telemetry_time,
+            "expected_per_s": 1 / sim.report_period,
+        })
+        power.disable_state_reporting()
+        power.close()
+    return results
+
+
+def print_results(results):
+    for r in results:
+        if "frames_per_s" in r:
+            print(f"{r['name']:<24} {r['frames_per_s']:9.1f} frames/s "
+                  f"(simulator: {r['expected_per_s']:.1f} frames/s)")
+        else:
+            print(f"{r['name']:<24} {r['cmd_per_s']:9.1f} cmd/s   p50: {r['p50_ms']:7.2f} ms"
+                  f"   p99: {r['p99_ms']:7.2f} ms   max: {r['max_ms']:7.2f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="dc6006l_class benchmark on simulated supply")
+    parser.add_argument("--n", type=int, default=200, help="commands per test")
+    parser.add_argument("--telemetry-time", type=float, default=2.0, help="s, telemetry rate test")
+    parser.add_argument("--report-period", type=float, default=0.05, help="s, simulator report period")
+    parser.add_argument("--reply-delay", type=float, default=0.002, help="s, simulator replay delay")
+    parser.add_argument("--jitter", type=float, default=0.0, help="s, simulator replay jitter")
+    parser.add_argument("--corrupt-rate", type=float, default=0.0, help="damaged frames probability")
+    parser.add_argument("--json", help="write results to json file")
+    a = parser.parse_args()
+    res = run(a.n, a.telemetry_time, dict(report_period=a.report_period, reply_delay=a.reply_delay,
+                                           jitter=a.jitter, corrupt_rate=a.corrupt_rate))
+    print_results(res)
+    if a.json:
+        with open(a.json, "w") as f:
+            json.dump(res, f, indent=2)
@@ -17,6 +17,10 @@
 
 import serial.tools.list_ports
 import serial
+import collections
+import json
+import struct
+import threading
 import time
 
 class bcolors:
@@ -41,24 +45,565 @@ def range_check(val, min, max, val_name):
     return val
 
 
+def v_out_cmd(voltage):
+    # returns (checked voltage, "V" command)
+    voltage = range_check(voltage, 0, 60, "voltage")
+    val = int(round((voltage * 100),1))
+    return voltage, f'V{str(val).zfill(4)}'
+
+
+def i_out_cmd(current):
+    # returns (checked current, "I" command)
+    current = range_check(current, 0, 6, "current")
+    current = round(current, 5)
+    val = int(current * 1000)
+    return current, f'I{str(val).zfill(4)}'
+
+
+def volt_protect_cmd(voltage):
+    # returns (checked voltage, "B" command)
+    if voltage > 61:
+        print(f"Wrong voltage: {voltage} V. Max output should be less then 61 V")
+        voltage = 61
+    if voltage < 0.2:
+        print(f"Wrong voltage: {voltage} V. Should be >= 0.2")
+        voltage = 0.2
+    val = int(round(voltage * 100))
+    return voltage, f'B{str(val).zfill(4)}'
+
+
+def current_protect_cmd(current):
+    # returns (checked current, "D" command)
+    current = range_check(current, 0, 6, "current")
+    val = int(round(current * 1000))
+    return current, f'D{str(val).zfill(4)}'
+
+
+def power_protect_cmd(power):
+    # returns (checked power, "E" command), {W/10}
+    power = range_check(power, 0, 360, "power")
+    val = int(round(power * 10))
+    return power, f'E{str(val).zfill(4)}'
+
+
+def timeout_cmds(hours, minutes, seconds):
+    # returns list of "H", "M", "S" commands of time protection
+    hours = range_check(int(hours), 0, 99, "hours")
+    minutes = range_check(int(minutes), 0, 59, "minutes")
+    seconds = range_check(int(seconds), 0, 59, "seconds")
+    return [f'H{str(hours).zfill(2)}', f'M{str(minutes).zfill(2)}', f'S{str(seconds).zfill(2)}']
+
+
+# fields of apply_config(), the same names as in get_status
+CONFIG_FIELDS = ("v_lim", "i_lim", "p_lim", "timeout_hh", "timeout_mm", "timeout_ss", "timeout_en")
+
+
+def config_cmds(config):
+    # {field: value} -> list of (field, expected status value, command)
+    unknown = set(config) - set(CONFIG_FIELDS)
+    if unknown:
+        raise ValueError(f"Unknown config fields: {sorted(unknown)}")
+    cmds = []
+    if config.get("v_lim") is not None:
+        txt = volt_protect_cmd(config["v_lim"])[1]
+        cmds.append(("v_lim", int(txt[1:]) / 100, txt))
+    if config.get("i_lim") is not None:
+        txt = current_protect_cmd(config["i_lim"])[1]
+        cmds.append(("i_lim", int(txt[1:]) / 1000, txt))
+    if config.get("p_lim") is not None:
+        txt = power_protect_cmd(config["p_lim"])[1]
+        cmds.append(("p_lim", int(txt[1:]) / 10, txt))
+    timeout = [config.get(f) for f in ("timeout_hh", "timeout_mm", "timeout_ss")]
+    if any(v is not None for v in timeout):
+        txts = timeout_cmds(*[v or 0 for v in timeout])
+        for field, v, txt in zip(("timeout_hh", "timeout_mm", "timeout_ss"), timeout, txts):
+            if v is not None:
+                cmds.append((field, int(txt[1:]), txt))
+    if config.get("timeout_en") is not None:
+        cmds.append(("timeout_en", int(bool(config["timeout_en"])), "X" if config["timeout_en"] else "Y"))
+    return cmds
+
+
+def check_config(cmds, status):
+    # {field: (expected, read back)} of the fields that did not take
+    failed = {}
+    for field, expected, _ in cmds:
+        if status is None or abs(status[field] - expected) > 1e-6:
+            failed[field] = (expected, None if status is None else status[field])
+    return failed
+
+
+# get_status fields that change only by commands, the rest comes from reports
+STATUS_STATIC = ("v_set", "i_set", "v_lim", "i_lim", "p_lim",
+                 "timeout_en", "timeout_hh", "timeout_mm", "timeout_ss")
+# cache fields changed by a command letter (not confirmed by a replay)
+# (V/I are cached again only from a matching echo, see _write_v_out/_write_i_out)
+CMD_FIELDS = {"V": ("v_set",), "I": ("i_set",), "B": ("v_lim",), "D": ("i_lim",), "E": ("p_lim",),
+              "H": ("timeout_hh",), "M": ("timeout_mm",), "S": ("timeout_ss",),
+              "X": ("timeout_en",), "Y": ("timeout_en",)}
+
+
+# periodic report: 0199A0700A0139A0A029A0A0A1A
+REPORT_LEN = 27
+REPORT_A_POS = frozenset((4, 9, 14, 16, 20, 22, 24, 26))
+
+
+# replay to V/I commands: v_set, i_set
+ECHO_LEN = 10
+ECHO_A_POS = frozenset((4, 9))
+# replay after "Q": "KB" + report + v_set, i_set, v_lim, i_lim, p_lim, timeout en/hh/mm/ss
+STATUS_LEN = 66
+STATUS_PREFIX = b"KB"
+STATUS_A_POS = frozenset([p + 2 for p in REPORT_A_POS] + [33, 38, 43, 48, 54, 56, 59, 62, 65])
+
+
+def is_frame(buf, start, length, a_pos, check_len=None, prefix=b""):
+    # checks prefix, "A" delimiters and digits of a frame. With check_len < length
+    # only the first bytes are checked (is it still a possible frame prefix?)
+    if check_len is None:
+        check_len = length
+    if check_len > length or len(buf) - start < check_len:
+        return False
+    for k in range(check_len):
+        c = buf[start + k]
+        if k < len(prefix):
+            if c != prefix[k]:
+                return False
+        elif k in a_pos:
+            if c != 0x41:  # "A"
+                return False
+        elif c < 0x30 or c > 0x39:
+            return False
+    return True
+
+
+def is_report(buf, start=0, length=REPORT_LEN):
+    return is_frame(buf, start, REPORT_LEN, REPORT_A_POS, length)
+
+
+def _next_frame(buf, pos):
+    # what starts at pos: True - a complete valid frame, None - a possible frame
+    # prefix (more bytes needed), False - no frame
+    left = len(buf) - pos
+    partial = False
+    for length, a_pos, prefix in ((STATUS_LEN, STATUS_A_POS, STATUS_PREFIX),
+                                  (REPORT_LEN, REPORT_A_POS, b""), (ECHO_LEN, ECHO_A_POS, b"")):
+        if is_frame(buf, pos, length, a_pos, min(left, length), prefix):
+            if left >= length:
+                return True
+            partial = True
+    return None if partial else False
+
+
+def scan_frames(buf, idle=False):
+    # splits received bytes into frames: returns (frames, consumed)
+    # frames - list of ("report" | "echo" | "status" | "junk", bytes).
+    # Echo replay looks like the first 10 bytes of a report, so a possible
+    # report prefix is kept until it is complete or the port is idle.
+    frames = []
+    junk = bytearray()
+    pos = 0
+    n = len(buf)
+    while pos < n:
+        left = n - pos
+        frame = None
+        if is_frame(buf, pos, STATUS_LEN, STATUS_A_POS, min(left, STATUS_LEN), STATUS_PREFIX):
+            if left >= STATUS_LEN:
+                frame = ("status", STATUS_LEN)
+            elif not idle:
+                break
+        if frame is None and is_frame(buf, pos, REPORT_LEN, REPORT_A_POS, min(left, REPORT_LEN)):
+            if left >= REPORT_LEN:
+                frame = ("report", REPORT_LEN)
+            elif not idle:
+                break
+        if frame is None and is_frame(buf, pos, ECHO_LEN, ECHO_A_POS, min(left, ECHO_LEN)):
+            if left >= ECHO_LEN:
+                # the head of a damaged report is followed by more digits: an echo
+                # must end the data, or be followed by a terminator or the next frame
+                nxt = pos + ECHO_LEN
+                after = True
+                if nxt < n and (0x30 <= buf[nxt] <= 0x39 or buf[nxt] == STATUS_PREFIX[0]):
+                    after = _next_frame(buf, nxt)
+                if after is None and not idle:
+                    break
+                if after:
+                    frame = ("echo", ECHO_LEN)
+            elif not idle:
+                break
+        if frame is None:
+            # CR/LF terminators and garbage
+            junk.append(buf[pos])
+            pos += 1
+            continue
+        if junk:
+            frames.append(("junk", bytes(junk)))
+            junk = bytearray()
+        frames.append((frame[0], bytes(buf[pos:pos + frame[1]])))
+        pos += frame[1]
+    if junk:
+        frames.append(("junk", bytes(junk)))
+    return frames, pos
+
+
+class frame_parser:
+    # Incremental parser of the received byte stream. Chunks of any size are
+    # fed in, partial frames are kept until the rest arrives (or the line is idle),
+    # garbage is skipped byte by byte until the next valid frame, so the stream
+    # resynchronizes by itself without a reporting restart.
+    def __init__(self):
+        self.buf = bytearray()
+        self.t0 = 0.0  # time.monotonic() of the first pending byte
+        self.frames = 0
+        self.junk_bytes = 0
+        # per frame of the last feed(): bytes of the chunk received after the frame end,
+        # gives the arrival time of frames that came in one chunk
+        self.after = []
+
+    def reset(self):
+        self.buf.clear()
+
+    def pending(self):
+        return len(self.buf)
+
+    def feed(self, chunk, idle=False, t=None):
+        # returns list of (time of the first byte, kind, frame)
+        # kind - "report" | "echo" | "status" | "junk". idle=True - no more bytes
+        # are coming, a pending possible prefix of a longer frame is closed
+        if t is None:
+            t = time.monotonic()
+        if not self.buf:
+            self.t0 = t
+        self.buf += chunk
+        frames, used = scan_frames(self.buf, idle)
+        left = len(self.buf)
+        del self.buf[:used]
+        out = []
+        self.after = []
+        t_frame = self.t0
+        for kind, frame in frames:
+            if kind == "junk":
+                self.junk_bytes += len(frame)
+            else:
+                self.frames += 1
+            out.append((t_frame, kind, frame))
+            left -= len(frame)
+            self.after.append(min(left, len(chunk)))
+            t_frame = t
+        self.t0 = t
+        return out
+
+    def flush(self, t=None):
+        return self.feed(b"", True, t)
+
+
+STATE_FIELDS = ("v_out", "i_out", "p_out", "p1", "temp", "cv_cc", "error", "on_off", "timestamp")
+STATUS_FIELDS = STATE_FIELDS[:-1] + STATUS_STATIC + ("timestamp",)
+# old get_state()/get_status() dict keys
+STATE_KEYS = {"Vout": "v_out", "Iout": "i_out", "Pout": "p_out", "P1": "p1", "Temp": "temp",
+              "CV_CC": "cv_cc", "Error": "error", "Output": "on_off"}
+
+# fixed offsets, "x" skips "A" delimiters
+REPORT_STRUCT = struct.Struct("4sx4sx4sx1sx3sx1sx1sx1sx")
+STATUS_STRUCT = struct.Struct("2x4sx4sx4sx1sx3sx1sx1sx1sx4sx4sx4sx4sx5sx1sx2sx2sx2sx")
+STATUS_SCALE = {8: 100, 9: 1000, 10: 100, 11: 1000, 12: 100}  # v_set, i_set, v_lim, i_lim, p_lim
+
+
+class State(collections.namedtuple("State", STATE_FIELDS)):
+    # one periodic report. Immutable, no per-instance dict.
+    # state[0], state.v_out and old keys state["Vout"] give the same value
+    __slots__ = ()
+    _keys = STATE_KEYS
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            return getattr(self, self._keys.get(key, key))
+        return tuple.__getitem__(self, key)
+
+    def to_dict(self, legacy=False):
+        # legacy=True - keys of the old get_state()/get_status() dict
+        if not legacy:
+            return self._asdict()
+        return {k: getattr(self, f) for k, f in self._keys.items()}
+
+
+class Status(collections.namedtuple("Status", STATUS_FIELDS)):
+    # "KB" status replay: report fields + setpoints, limits, time protection
+    __slots__ = ()
+    _keys = dict([(f, f) for f in ("v_out", "i_out", "p_out", "temp", "cv_cc")] +
+                 [("limit_error", "error"), ("on_off", "on_off")] + [(f, f) for f in STATUS_STATIC])
+    __getitem__ = State.__getitem__
+    to_dict = State.to_dict
+
+
+def decode_report(frame, timestamp=None):
+    # frame: 27 bytes/str of periodic report, decoded by fixed offsets
+    if isinstance(frame, str):
+        frame = frame.encode()
+    z = REPORT_STRUCT.unpack(frame)
+    return State(int(z[0]) / 100, int(z[1]) / 1000, int(z[2]) / 100, int(z[3]),
+                 int(z[4]), int(z[5]), int(z[6]), int(z[7]), timestamp)
+
+
+def decode_status(frame, timestamp=None):
+    # frame: 66 bytes/str of "KB" status replay
+    if isinstance(frame, str):
+        frame = frame.encode()
+    z = [int(x) for x in STATUS_STRUCT.unpack(frame)]
+    for k, scale in STATUS_SCALE.items():
+        z[k] = z[k] / scale
+    z[0] /= 100
+    z[1] /= 1000
+    z[2] /= 100
+    return Status(*z, timestamp)
+
+
+def state_to_dict(state):
+    # State -> dict of the old get_state()
+    return state.to_dict(legacy=True)
+
+
+class state_ring:
+    # Fixed-size ring of telemetry samples with a single writer (reader thread).
+    # Writer fills the slot first and only then publishes new counter value,
+    # so readers do not need a lock. Counter is never wrapped: sample number n
+    # lives in slot n % size, readers re-check counter to drop overwritten slots.
+    def __init__(self, size=4096):
+        self.size = size
+        self._slots = [None] * size
+        self._count = 0
+
+    def __len__(self):
+        return min(self._count, self.size)
+
+    def push(self, sample):
+        n = self._count
+        self._slots[n % self.size] = sample
+        self._count = n + 1
+
+    def count(self):
+        # total number of samples pushed since start
+        return self._count
+
+    def latest(self):
+        n = self._count
+        if n == 0:
+            return None
+        return self._slots[(n - 1) % self.size]
+
+    def read_from(self, seq):
+        # returns (samples, next_seq, lost): all samples with number >= seq.
+        # lost - number of samples overwritten before they were read
+        # slot of sample n - size is being overwritten by the writer of sample n
+        n = self._count
+        first = max(seq, n - self.size + 1, 0)
+        out = [self._slots[i % self.size] for i in range(first, n)]
+        # slots could be overwritten by the writer while copying
+        oldest_valid = self._count - self.size + 1
+        if oldest_valid > first:
+            out = out[oldest_valid - first:]
+            first = oldest_valid
+        return out, n, first - seq if first > seq else 0
+
+    def since(self, timestamp):
+        # all buffered samples newer than timestamp
+        samples = self.read_from(0)[0]
+        i = len(samples)
+        while i > 0 and samples[i - 1].timestamp > timestamp:
+            i -= 1
+        return samples[i:]
+
+
+class ring_follower:
+    # Background thread that passes every new sample of source.ring to
+    # consume(samples, lost), checked every period s. lost - samples overwritten
+    # in the ring before they were read. Samples pushed after the constructor
+    # returns are followed, stop() passes the rest once more
+    def __init__(self, source, consume, period=0.1, name="dc6006l_follower"):
+        self.source = source
+        self.consume = consume
+        self.period = period
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, args=(source.ring.count(),), name=name,
+                                        daemon=True)
+        self._thread.start()
+
+    def _run(self, seq):
+        ring = self.source.ring
+        while not self._stop.wait(self.period):
+            samples, seq, lost = ring.read_from(seq)
+            if samples or lost:
+                self.consume(samples, lost)
+        samples, seq, lost = ring.read_from(seq)
+        self.consume(samples, lost)
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+
+# upper bounds of latency histogram buckets, s (the last bucket is everything above)
+LATENCY_BUCKETS = (0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1.0)
+
+
+class link_stats:
+    # Counters of the serial link: per command latency histograms, retries,
+    # timeouts, malformed frames, bytes in/out. Plain integer updates, cheap
+    # enough to stay on. Hooks are called as hook(event, cmd, value).
+    def __init__(self):
+        self.hooks = []
+        self.reset()
+
+    def reset(self):
+        self.started = time.time()
+        self.commands = {}  # letter: sent count
+        self.latency = {}  # letter: [count, sum, max, bucket counts...]
+        self.retries = {}  # operation: count
+        self.timeouts = {}  # letter: count
+        self.malformed = 0  # rejected frames / garbage segments
+        self.malformed_bytes = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+
+    def _emit(self, event, cmd, value):
+        # a failing hook must not break the command or the telemetry reader
+        for hook in self.hooks:
+            try:
+                hook(event, cmd, value)
+            except Exception as e:
+                print(f"{bcolors.FAIL}Stats hook {hook}: {e}{bcolors.ENDC}")
+
+    def sent(self, cmd, n_bytes):
+        letter = cmd[:1]
+        self.commands[letter] = self.commands.get(letter, 0) + 1
+        self.bytes_out += n_bytes
+        if self.hooks:
+            self._emit("sent", cmd, n_bytes)
+
+    def received(self, n_bytes):
+        self.bytes_in += n_bytes
+
+    def replied(self, cmd, latency):
+        h = self.latency.get(cmd[:1])
+        if h is None:
+            h = self.latency[cmd[:1]] = [0, 0.0, 0.0] + [0] * (len(LATENCY_BUCKETS) + 1)
+        h[0] += 1
+        h[1] += latency
+        if latency > h[2]:
+            h[2] = latency
+        k = 0
+        while k < len(LATENCY_BUCKETS) and latency > LATENCY_BUCKETS[k]:
+            k += 1
+        h[3 + k] += 1
+        if self.hooks:
+            self._emit("latency", cmd, latency)
+
+    def timeout(self, cmd):
+        letter = cmd[:1]
+        self.timeouts[letter] = self.timeouts.get(letter, 0) + 1
+        if self.hooks:
+            self._emit("timeout", cmd, 1)
+
+    def retry(self, operation):
+        self.retries[operation] = self.retries.get(operation, 0) + 1
+        if self.hooks:
+            self._emit("retry", operation, 1)
+
+    def bad_frame(self, frame):
+        self.malformed += 1
+        self.malformed_bytes += len(frame)
+        if self.hooks:
+            self._emit("malformed", frame, len(frame))
+
+    def snapshot(self):
+        latency = {}
+        for letter, h in self.latency.items():
+            latency[letter] = {
+                "count": h[0],
+                "mean": h[1] / h[0],
+                "max": h[2],
+                "buckets": dict(zip([str(b) for b in LATENCY_BUCKETS] + ["inf"], h[3:])),
+            }
+        return {
+            "time": time.time() - self.started,
+            "commands": dict(self.commands),
+            "latency": latency,
+            "retries": dict(self.retries),
+            "timeouts": dict(self.timeouts),
+            "malformed": self.malformed,
+            "malformed_bytes": self.malformed_bytes,
+            "bytes_in": self.bytes_in,
+            "bytes_out": self.bytes_out,
+        }
+
+    def export(self, path):
+        with open(path, "w") as f:
+            json.dump(self.snapshot(), f, indent=2)
+
+
 class dc6006l_class:
     def __init__(self):
         self.ser = None
+        self.ring = None
+        self.ring_size = 4096
+        self._reader = None
+        self._reader_stop = None
+        # bytes that are not a periodic report (command replies), filled by reader
+        self._rx_other = bytearray()
+        # the same replies as (time.monotonic() of the first byte, kind, frame)
+        self._rx_frames = collections.deque(maxlen=64)
+        self.parser = frame_parser()
+        self._rx_cond = threading.Condition()
+        # notified by the reader after new reports are in the ring
+        self._state_cond = threading.Condition()
+        # replay deadline and quiet time on the line that ends a partial frame
+        self.reply_timeout = 0.5
+        self.idle_gap = 0.01
+        # minimal time between two commands (firmware can lose back-to-back commands)
+        self.min_cmd_interval = 0.0
+        self._last_cmd_time = 0.0
+        # last confirmed setpoints/limits (fields of get_status)
+        self.cache = {}
+        self._setpoint_lock = threading.RLock()
+        # one caller at a time writes commands and reads the port (polled mode) or the
+        # replies of the reader (streaming), the wait=False flusher included
+        self._io_lock = threading.RLock()
+        # latest not yet written V/I setpoints of set_v_out(wait=False)
+        self._pending = {}
+        self._pending_cond = threading.Condition()
+        self._flusher = None
+        self.stats = link_stats()
+        # get_state()/get_status() return old style dicts instead of State/Status
+        self.return_dicts = False
+        # deadline of output_enable/output_disable and the last measured switch latency
+        self.output_timeout = 1.0
+        self.last_switch_latency = None
+        # callback(sample) for every report, called from the reader thread (keep it short)
+        self.report_hooks = []
 
-    def init(self, com_port):
-        com_port_list = [comport.device for comport in serial.tools.list_ports.comports()]
-        if com_port not in com_port_list:
+    def init(self, com_port, check_port=True):
+        # check_port=False skips the port list check (pseudo-terminals, simulator)
+        com_port_list = []
+        if check_port:
+            com_port_list = [comport.device for comport in serial.tools.list_ports.comports()]
+        if check_port and com_port not in com_port_list:
             print("COM port connected")
             print("Please ensure that USB is connected")
             print(f"Please check COM port Number. Currently it is {com_port} ")
             print(f'Founded COM ports:{com_port_list}')
             return False
         else:
-            self.ser = serial.Serial(
-                port=com_port,
-                baudrate=115200,
-                timeout=0.1
-            )
+            try:
+                # exclusive: a port used by another process (or being probed) is not shared
+                self.ser = serial.Serial(
+                    port=com_port,
+                    baudrate=115200,
+                    timeout=0.1,
+                    exclusive=True
+                )
+            except serial.SerialException as e:
+                print(f"{bcolors.FAIL}Can not open {com_port}: {e}{bcolors.ENDC}")
+                return False
             if not self.ser.isOpen():
                 self.ser.open()
             # tmp = self.ser.isOpen()
@@ -67,36 +612,235 @@ class dc6006l_class:
             return True
 
     def close(self):
+        self.flush(self.reply_timeout)
+        self._stop_reader()
+        self.invalidate_cache()
         self.ser.close()
         self.ser = None
 
+    def _write_cmd(self, cmd_str):
+        wait = self._last_cmd_time + self.min_cmd_interval - time.monotonic()
+        if wait > 0:
+            time.sleep(wait)
+        txt = f'{cmd_str}\r\n'.encode()
+        self.ser.write(txt)
+        self._last_cmd_time = time.monotonic()
+        self.stats.sent(cmd_str, len(txt))
+        # value is known only after the next status replay
+        for field in CMD_FIELDS.get(cmd_str[:1], ()):
+            self.cache.pop(field, None)
+
     def send(self, cmd_str):
-        self.ser.reset_output_buffer()
-        time.sleep(0.1)
-        txt = f'{cmd_str}\r\n'
-        self.ser.write(txt.encode())
+        with self._io_lock:
+            self._write_cmd(cmd_str)
 
-    def query(self, n_bytes, cmd_str=None):
+    def query(self, n_bytes, cmd_str=None, timeout=None):
+        # raw read of n_bytes, returns as soon as n_bytes are received or on deadline
+        with self._io_lock:
+            return self._query(n_bytes, cmd_str, timeout)
+
+    def _query(self, n_bytes, cmd_str, timeout):
+        if timeout is None:
+            timeout = self.reply_timeout
+        if self.is_streaming():
+            return self._query_streaming(n_bytes, cmd_str, timeout)
         if cmd_str != None:
-            self.ser.reset_output_buffer()
-            txt = f'{cmd_str}\r\n'
             self.ser.reset_input_buffer()
-            self.ser.write(txt.encode())
-            time.sleep(0.15)
-        read_back = self.ser.read(n_bytes).decode()
+            self._write_cmd(cmd_str)
+        read_back = self._read_bytes(n_bytes, timeout).decode()
         return read_back
 
-    def set_v_out(self, voltage):
-        voltage = range_check(voltage, 0, 60, "voltage")
-        val = int(round((voltage * 100),1))
-        txt = f'V{str(val).zfill(4)}'
-        n_bytes = 10
-        read_back = self.query(n_bytes, txt)
+    def _read_bytes(self, n_bytes, timeout):
+        # ser.read() with own deadline, port timeout is not reconfigured
+        data = bytearray()
+        deadline = time.monotonic() + timeout
+        while len(data) < n_bytes:
+            waiting = self.ser.in_waiting
+            if waiting:
+                chunk = self.ser.read(min(waiting, n_bytes - len(data)))
+                self.stats.received(len(chunk))
+                data += chunk
+            elif time.monotonic() >= deadline:
+                break
+            else:
+                time.sleep(0.0005)
+        return bytes(data)
+
+    def _query_streaming(self, n_bytes, cmd_str, timeout):
+        # port is owned by reader thread, reply bytes are taken from _rx_other
+        with self._rx_cond:
+            if cmd_str != None:
+                self._rx_other.clear()
+                self._write_cmd(cmd_str)
+            deadline = time.monotonic() + timeout
+            while len(self._rx_other) < n_bytes:
+                left = deadline - time.monotonic()
+                if left <= 0:
+                    break
+                self._rx_cond.wait(left)
+            read_back = bytes(self._rx_other[:n_bytes])
+            del self._rx_other[:n_bytes]
+        return read_back.decode()
+
+    def query_frame(self, cmd_str, kind="echo", timeout=None):
+        # sends command and waits for the first complete and valid replay frame
+        # of given kind. Periodic reports in between are skipped (or go to the ring).
+        # returns frame as str, "" on timeout
+        with self._io_lock:
+            return self._query_frame(cmd_str, kind, timeout)
+
+    def _query_frame(self, cmd_str, kind, timeout):
+        if timeout is None:
+            timeout = self.reply_timeout
+        deadline = time.monotonic() + timeout
+        if self.is_streaming():
+            with self._rx_cond:
+                self._rx_other.clear()
+                self._rx_frames.clear()
+                t_cmd = time.monotonic()
+                self._write_cmd(cmd_str)
+                while True:
+                    # frames started before the command are late replays to a previous one
+                    while self._rx_frames:
+                        t, k, frame = self._rx_frames.popleft()
+                        if k == kind and t >= t_cmd:
+                            self.stats.replied(cmd_str, time.monotonic() - t_cmd)
+                            return frame.decode()
+                    left = deadline - time.monotonic()
+                    if left <= 0 or not self.is_streaming():
+                        self.stats.timeout(cmd_str)
+                        return ""
+                    self._rx_cond.wait(left)
+        # output is not reset: commands written just before (apply_config) may still be queued
+        self.ser.reset_input_buffer()
+        self.parser.reset()
+        self._write_cmd(cmd_str)
+        t_cmd = self._last_cmd_time
+        while True:
+            left = deadline - time.monotonic()
+            if left <= 0:
+                self.stats.timeout(cmd_str)
+                return ""
+            chunk = self._read_bytes(max(1, self.ser.in_waiting), min(left, self.idle_gap))
+            for t, k, frame in self.parser.feed(chunk, idle=not chunk):
+                if k == kind:
+                    self.stats.replied(cmd_str, time.monotonic() - t_cmd)
+                    return frame.decode()
+                if k == "junk":
+                    self.stats.bad_frame(frame)
+
+    def is_streaming(self):
+        # False also when the reader stopped on a port error
+        return self._reader is not None
+
+    def _start_reader(self):
+        if self._reader is not None:
+            return
+        if self.ring is None or self.ring.size != self.ring_size:
+            self.ring = state_ring(self.ring_size)
+        self._rx_other.clear()
+        self._reader_stop = threading.Event()
+        self._reader = threading.Thread(target=self._reader_loop, args=(self._reader_stop,),
+                                        name="dc6006l_reader", daemon=True)
+        self._reader.start()
+
+    def _stop_reader(self):
+        if self._reader is None:
+            return
+        self._reader_stop.set()
+        if self._reader is not threading.current_thread():
+            self._reader.join()
+        self._reader = None
+
+    def _reader_loop(self, stop):
+        try:
+            self._read_reports(stop)
+        finally:
+            if not stop.is_set():
+                # died on a port error: not streaming any more, waiters wake up
+                self._reader = None
+            with self._state_cond:
+                self._state_cond.notify_all()
+            with self._rx_cond:
+                self._rx_cond.notify_all()
+
+    def _read_reports(self, stop):
+        # parses periodic reports into the ring, everything else goes to _rx_other
+        parser = self.parser
+        parser.reset()
+        ser = self.ser
+        byte_time = 10 / ser.baudrate
+        t_last = 0.0
+        while not stop.is_set():
+            try:
+                if parser.pending():
+                    # partial frame pending, short wait to see if the line is idle
+                    # (_read_bytes() counts the received bytes)
+                    chunk = self._read_bytes(max(1, ser.in_waiting), self.idle_gap)
+                else:
+                    chunk = ser.read(max(1, ser.in_waiting))
+                    self.stats.received(len(chunk))
+            except (serial.SerialException, OSError, TypeError) as e:
+                if not stop.is_set():
+                    print(f"{bcolors.FAIL}Telemetry reader stopped: {e}{bcolors.ENDC}")
+                break
+            if not chunk and not parser.pending():
+                continue
+            now = time.time()
+            other = bytearray()
+            replies = []
+            reports = False
+            for (t, kind, frame), after in zip(parser.feed(chunk, idle=not chunk), parser.after):
+                if kind == "report":
+                    # frames of one chunk arrived one after another at the line rate,
+                    # a burst can come faster: never before the previous frame
+                    t_last = max(now - after * byte_time, t_last)
+                    sample = decode_report(frame, t_last)
+                    self.ring.push(sample)
+                    reports = True
+                    for hook in self.report_hooks:
+                        try:
+                            hook(sample)
+                        except Exception as e:
+                            print(f"{bcolors.FAIL}Report hook {hook}: {e}{bcolors.ENDC}")
+                else:
+                    if kind == "junk":
+                        self.stats.bad_frame(frame)
+                    other += frame
+                    replies.append((t, kind, frame))
+            if other:
+                with self._rx_cond:
+                    self._rx_other += other
+                    self._rx_frames.extend(replies)
+                    self._rx_cond.notify_all()
+            if reports:
+                with self._state_cond:
+                    self._state_cond.notify_all()
+
+    def set_v_out(self, voltage, wait=True):
+        # wait=False: returns at once, the latest value is written in background
+        # (values set faster than the supply replies are skipped). See flush()
+        voltage, txt = v_out_cmd(voltage)
+        if not wait:
+            return self._queue_setpoint("V", voltage, txt)
+        with self._setpoint_lock:
+            with self._pending_cond:
+                self._pending.pop("V", None)
+            if self._cached_setpoint("v_set", txt, 100):
+                return True
+            return self._write_v_out(voltage, txt)
+
+    def _write_v_out(self, voltage, txt):
+        read_back = self.query_frame(txt, "echo")
         #print(read_back)
         if len(read_back) == 10 and read_back[4] == "A" and read_back[9] == "A":
             z = read_back.split("A")
             v_out = int(z[0]) / 100
             i_out = int(z[1]) / 1000
+            if int(z[0]) == int(txt[1:]):
+                # only an echo of the commanded value is trusted
+                self.cache["v_set"] = v_out
+                self.cache["i_set"] = i_out
             if voltage == v_out:
                 # print(f" V: {v_out} I: {i_out}, OK")
                 return True
@@ -109,17 +853,27 @@ class dc6006l_class:
                     return True
 
 
-    def set_i_out(self, current):
-        current = range_check(current, 0, 6, "current")
-        current = round(current, 5)
-        val = int(current * 1000)
-        txt = f'I{str(val).zfill(4)}'
-        n_bytes = 10
-        read_back = self.query(n_bytes, txt)
+    def set_i_out(self, current, wait=True):
+        current, txt = i_out_cmd(current)
+        if not wait:
+            return self._queue_setpoint("I", current, txt)
+        with self._setpoint_lock:
+            with self._pending_cond:
+                self._pending.pop("I", None)
+            if self._cached_setpoint("i_set", txt, 1000):
+                return True
+            return self._write_i_out(current, txt)
+
+    def _write_i_out(self, current, txt):
+        val = int(txt[1:])
+        read_back = self.query_frame(txt, "echo")
         if len(read_back) == 10:
             z = read_back.split("A")
             v_out = int(z[0]) / 100
             i_out = int(z[1]) / 1000
+            if int(z[1]) == val:
+                self.cache["v_set"] = v_out
+                self.cache["i_set"] = i_out
             if current == i_out:
                 # print(f" V: {v_out} I: {i_out}, OK")
                 return True
@@ -129,258 +883,249 @@ class dc6006l_class:
                 return False
 
 
-    def __output_enable_p(self):
-        array_state = None
-        self.send("N")
-        state = self.get_state()
-        return state["Output"] # return off_on variable of array_status
+    def _cached_setpoint(self, field, txt, scale):
+        # True if the supply already confirmed the same value
+        return field in self.cache and round(self.cache[field] * scale) == int(txt[1:])
 
-    def output_enable(self):
-        j = 0
-        while (j < 4):
-            j += 1
-            if (self.__output_enable_p() == 1):
-                return True
-            else:
-                time.sleep(0.3)
-
-    def __output_disable_p(self):
-        self.ser.reset_output_buffer()
-        self.ser.write("F\r\n".encode())
-        array_state = self.get_state()
-        return array_state  # return off_on variable of array_status
-
-    def output_disable(self):
-        j = 0
-        while (j < 4):
-            j += 1
-            state = self.__output_disable_p()
-            # print(state)
-            if state != None:
-                if state["Output"] == 0:
-                    return True
-            else:
-                time.sleep(0.3)
-        return False
+    def _queue_setpoint(self, letter, value, txt):
+        with self._pending_cond:
+            self._pending[letter] = (value, txt)
+            if self._flusher is None:
+                self._flusher = threading.Thread(target=self._flush_loop, name="dc6006l_flusher",
+                                                 daemon=True)
+                self._flusher.start()
+            self._pending_cond.notify_all()
+        return True
 
-    def get_status(self, var_name="none"):
-        replay_len = 66
-        self.disable_state_reporting()
-        time.sleep(0.1)
-        self.enable_state_reporting()
-        txt = self.query(replay_len, None)
-        # i=0
-        # while i < 4:
-        #     i = i + 1
-        #     txt = self.query(replay_len, None)
-        #     print(f"i:{i} get state: {txt}")
-        #     if txt == "":
-        #         # self.ser.reset_input_buffer()
-        #         time.sleep(0.05)
-        #     else:
-        #         # ret_val = None
-        #         if len(txt) == replay_len:
-        #             if ((txt[4] == "A") and
-        #                     (txt[9] == "A") and (txt[14] == "A") and
-        #                     (txt[16] == "A") and (txt[20] == "A") and
-        #                     (txt[22] == "A")):
-        #                 print(txt)
-        #                 z = txt.split("A")
-        #                 v_out = int(z[0]) / 100
-        #                 i_out = int(z[1]) / 1000
-        #                 p_out = int(z[2]) / 100
-        #                 p1 = int(z[3])
-        #                 temp = int(z[4])
-        #                 cv_cc = int(z[5])
-        #                 error = int(z[6])
-        #                 off_on = int(z[7])
-        #                 status["Vout"] = v_out
-        #                 status["Iout"] = i_out
-        #                 status["Pout"] = p_out
-        #                 status["P1"] = p1
-        #                 status["Temp"] = temp
-        #                 status["CV_CC"] = cv_cc
-        #                 status["Error"] = error
-        #                 status["Output"] = off_on
-        #                 ret_val = [v_out, i_out, p_out, p1, temp, cv_cc, error, off_on]
-        #                 # return ret_val
-        #                 return  status
-        #                 break
-        # return None
-
-
-        if txt.find("KB") != -1:
-            self.disable_state_reporting()
-            time.sleep(0.5)
-            self.enable_state_reporting()
-            time.sleep(0.1)
-            txt = self.query(66, None)
-
-        if txt.find("KB") == -1:
-            print(f"Get_status. Wrong replay on COM: {txt}")
-            print("Please check the COM port number")
-            # self.ser.close()
-            return False
+    def _flush_loop(self):
+        # writes pending setpoints one by one, only the latest value of each is kept
+        while True:
+            with self._pending_cond:
+                if not self._pending or self.ser is None:
+                    self._pending.clear()
+                    self._flusher = None
+                    self._pending_cond.notify_all()
+                    return
+                letter = next(iter(self._pending))
+            with self._setpoint_lock:
+                with self._pending_cond:
+                    item = self._pending.pop(letter, None)
+                if item is None:
+                    continue
+                value, txt = item
+                if letter == "V":
+                    if not self._cached_setpoint("v_set", txt, 100):
+                        self._write_v_out(value, txt)
+                elif not self._cached_setpoint("i_set", txt, 1000):
+                    self._write_i_out(value, txt)
+
+    def flush(self, timeout=None):
+        # waits until setpoints of set_v_out/set_i_out(wait=False) are written
+        with self._pending_cond:
+            return self._pending_cond.wait_for(lambda: self._flusher is None, timeout)
+
+    def invalidate_cache(self):
+        self.cache.clear()
+
+    def wait_report(self, match, seq, timeout):
+        # first ring sample after sequence number seq with match(sample) True,
+        # wakes up on every new report. None on timeout (streaming only)
+        deadline = time.monotonic() + timeout
+        with self._state_cond:
+            while True:
+                samples, seq, _ = self.ring.read_from(seq)
+                for sample in samples:
+                    if match(sample):
+                        return sample
+                left = deadline - time.monotonic()
+                if left <= 0 or not self.is_streaming():
+                    return None
+                self._state_cond.wait(left)
+
+    def output_switch(self, on, timeout=None):
+        # sends "N"/"F" and waits for the first report with the new output state
+        # returns {"ok", "latency" (s from the command to that report), "state"}
+        if timeout is None:
+            timeout = self.output_timeout
+        on_off = 1 if on else 0
+        cmd = "N" if on else "F"
+        state = None
+        if self.is_streaming():
+            seq = self.ring.count()
+            t_cmd = time.time()
+            self.send(cmd)
+            state = self.wait_report(lambda s: s.on_off == on_off, seq, timeout)
+            latency = None if state is None else state.timestamp - t_cmd
+        else:
+            with self._io_lock:
+                # reports buffered before the command are stale
+                deadline = time.monotonic() + timeout
+                self.ser.reset_input_buffer()
+                self.parser.reset()
+                t_cmd = time.time()
+                self.send(cmd)
+                latency = None
+                while True:
+                    left = deadline - time.monotonic()
+                    if left <= 0:
+                        state = None
+                        break
+                    state = self.get_state(timeout=left)
+                    if state is not None and state["Output"] == on_off:
+                        latency = time.time() - t_cmd
+                        break
+        self.last_switch_latency = latency
+        if latency is None:
+            self.stats.timeout(cmd)
         else:
-            # print(f"get_status: {txt}")
-            txt = txt.replace("KB","0",1)
+            self.stats.replied(cmd, latency)
+        return {"ok": latency is not None, "latency": latency, "state": state}
 
-            z = txt.split('A')
-            # print(f"get_status: {z}")
-            # decode first replay string.
-            # there is no input voltage ??
-            v_out = int(z[0]) / 100
-            i_out = int(z[1]) / 1000
-            p_out = int(z[2]) / 100
-            p1 = int(z[3])
-            temp = int(z[4])
-            cv_cc = int(z[5])
-            limit_error = int(z[6])
-            on_off = int(z[7])
-            v_set = int(z[8]) / 100
-            i_set = int(z[9]) / 1000
-            v_lim = int(z[10]) / 100
-            i_lim = int(z[11]) / 1000
-            p_lim = int(z[12]) / 100
-            tout_en = int(z[13])
-            tout_hh = int(z[14])
-            tout_mm = int(z[15])
-            tout_ss = int(z[16])
-
-
-
-            # v_out = int(txt[2:6]) / 100
-            # i_out = int(txt[7:11]) / 1000
-            # p_out = int(txt[13:16]) / 100
-            # p1 = int(txt[17:18])
-            # temp = int(txt[19:22])
-            # cv_cc = int(txt[23:24])
-            # limit_error = int(txt[25:26])
-            # on_off = int(txt[27:28])
-            # v_set = int(txt[29:33]) / 100
-            # i_set = int(txt[34:38]) / 1000
-            # v_lim = int(txt[39:43]) / 100
-            # i_lim = int(txt[44:48]) / 1000
-            # p_lim = int(txt[49:54]) / 100
-            # tout_en = int(txt[55:56])
-            # tout_hh = int(txt[57:59])
-            # tout_mm = int(txt[60:62])
-            # tout_ss = int(txt[63:65])
-            status = {
-                "v_out": v_out,
-                "i_out": i_out,
-                "p_out": p_out,
-                "temp": temp,
-                "cv_cc": cv_cc,
-                "limit_error": limit_error,
-                "on_off": on_off,
-                "v_set": v_set,
-                "i_set": i_set,
-                "v_lim": v_lim,
-                "i_lim": i_lim,
-                "p_lim": p_lim,
-                "timeout_en": tout_en,
-                "timeout_hh": tout_hh,
-                "timeout_mm": tout_mm,
-                "timeout_ss": tout_ss
-            }
-            if var_name == "none":
-                return status
-            else:
+    def output_enable(self, timeout=None):
+        # True when a report shows the output on, see output_switch()
+        return self.output_switch(True, timeout)["ok"]
+
+    def output_disable(self, timeout=None):
+        return self.output_switch(False, timeout)["ok"]
+
+    def get_status(self, var_name="none", refresh=False):
+        # setpoints and limits come from the cache, measured values from the latest
+        # report while streaming. refresh=True always reads the supply
+        if not refresh:
+            status = self._cached_status()
+            if status is not None:
+                if var_name == "none":
+                    return status.to_dict(legacy=True) if self.return_dicts else status
                 return status[var_name]
+            if var_name in STATUS_STATIC and var_name in self.cache:
+                return self.cache[var_name]
+        status = self._read_status()
+        if not status:
+            return status
+        for field in STATUS_STATIC:
+            self.cache[field] = status[field]
+        if var_name == "none":
+            return status.to_dict(legacy=True) if self.return_dicts else status
+        return status[var_name]
+
+    def _cached_status(self):
+        if not self.is_streaming() or any(f not in self.cache for f in STATUS_STATIC):
+            return None
+        sample = self.ring.latest()
+        if sample is None:
+            return None
+        return Status(*sample[:-1], *[self.cache[f] for f in STATUS_STATIC], sample.timestamp)
+
+    def _read_status(self):
+        # "KB" status replay is the answer to "Q", taken from the byte stream by the parser
+        txt = self.query_frame("Q", "status")
+        if txt == "":
+            # some firmware answers only when reporting starts, restart it once
+            self.stats.retry("get_status")
+            self._write_cmd("W")
+            txt = self.query_frame("Q", "status")
+        if txt == "":
+            print(f"Get_status. No status replay on {self.ser.port}")
+            print("Please check the COM port number")
+            return False
+        return decode_status(txt, time.time())
+
+    def apply_config(self, config=None, verify=True, **fields):
+        # protection/timer profile in one transaction: all commands are written
+        # back-to-back, then the whole profile is checked against one status replay.
+        # config/fields - CONFIG_FIELDS: v_lim (V), i_lim (A), p_lim (W),
+        # timeout_hh/mm/ss, timeout_en (bool)
+        # returns {"ok", "failed": {field: (expected, read back)}, "status"}
+        config = dict(config or {}, **fields)
+        cmds = config_cmds(config)
+        with self._setpoint_lock, self._io_lock:
+            for _, _, txt in cmds:
+                self._write_cmd(txt)
+            if not verify:
+                return {"ok": True, "failed": {}, "status": None}
+            status = self._read_status()
+            failed = check_config(cmds, status or None)
+            if status and failed:
+                # can be the late replay to an earlier "Q", read once more
+                self.stats.retry("apply_config")
+                status = self._read_status()
+                failed = check_config(cmds, status or None)
+        if status:
+            for field in STATUS_STATIC:
+                self.cache[field] = status[field]
+        for field, (expected, value) in failed.items():
+            print(f"{bcolors.WARNING}apply_config: {field} expected {expected}, "
+                  f"read {value}{bcolors.ENDC}")
+        return {"ok": not failed, "failed": failed, "status": status or None}
 
     def set_volt_protect(self, voltage):
-        if voltage > 61:
-            print(f"Wrong voltage: {voltage} V. Max output should be less then 61 V")
-            voltage = 61
-        if voltage < 0.2:
-            print(f"Wrong voltage: {voltage} V. Should be >= 0.2")
-            voltage = 0.2
-        val = int(voltage * 100)
-        txt = f'B{str(val).zfill(4)}\r\n'
-        # print for debug
-        # print(txt)
-        self.ser.reset_input_buffer()
-        self.ser.reset_output_buffer()
-        self.ser.write(txt.encode())
-        read_back = self.ser.read(27).decode()
-        if len(read_back) == 27:
-            v_lim = int(txt[0:4]) / 100
-            i_lim = int(txt[5:9]) / 1000
-            p_lim = int(txt[10:14]) / 100
-            if voltage == v_out:
-                # print(f" V: {v_out} I: {i_out}, OK")
-                return True
-            else:
-                print("Something wrong while setting voltage. Set and read back value mismatch")
-                return False
+        return self.apply_config(v_lim=voltage)["ok"]
 
     def set_current_protect(self, current):
-        current = range_check(current, 0, 6, "current")
-        val = int(current * 1000)
-        txt = f'D{str(val).zfill(4)}\r\n'
-        # print for debug
-        # print(txt)
-        self.ser.reset_input_buffer()
-        self.ser.reset_output_buffer()
-        self.ser.write(txt.encode())
-        read_back = self.ser.read(27).decode()
-        if len(read_back) == 27:
-            v_lim = int(txt[0:4]) / 100
-            i_lim = int(txt[5:9]) / 1000
-            p_lim = int(txt[10:14]) / 100
-            if voltage == v_out:
-                # print(f" V: {v_out} I: {i_out}, OK")
-                return True
-            else:
-                print("Something wrong while setting voltage. Set and read back value mismatch")
-                return False
+        return self.apply_config(i_lim=current)["ok"]
 
-    def enable_state_reporting(self):
-        self.send("Q")
+    def set_power_protect(self, power):
+        return self.apply_config(p_lim=power)["ok"]
+
+    def set_time_protect(self, hours, minutes, seconds):
+        return self.apply_config(timeout_hh=hours, timeout_mm=minutes, timeout_ss=seconds)["ok"]
+
+    def time_protect_enable(self):
+        return self.apply_config(timeout_en=True)["ok"]
+
+    def time_protect_disable(self):
+        return self.apply_config(timeout_en=False)["ok"]
+
+    def enable_state_reporting(self, streaming=True):
+        # "Q" starts periodic reports. With streaming=True background reader
+        # keeps them in self.ring, so get_state() does not wait for the port
+        with self._io_lock:
+            self.send("Q")
+            if streaming:
+                self._start_reader()
 
     def disable_state_reporting(self):
-        self.send("W")
-
-    def get_state(self):
-        ostate = {}
-        ret_val = None
-        replay_len = 27
-        i = 0
-        while i < 5:
-            i = i + 1
-            txt = self.query(replay_len, None)
-            # print(f"i:{i} get state: {txt}")
-            if txt == "":
-                # self.ser.reset_input_buffer()
-                time.sleep(0.05)
-            else:
-                #ret_val = None
-                if len(txt) == replay_len:
-                    if ((txt[4] == "A") and
-                            (txt[9] == "A") and (txt[14] == "A") and
-                            (txt[16] == "A") and (txt[20] == "A") and
-                            (txt[22] == "A")):
-                        # print(txt)
-                        z = txt.split("A")
-                        v_out = int(z[0]) / 100
-                        i_out = int(z[1]) / 1000
-                        p_out = int(z[2]) / 100
-                        p1 = int(z[3])
-                        temp = int(z[4])
-                        cv_cc = int(z[5])
-                        error = int(z[6])
-                        off_on = int(z[7])
-                        ostate["Vout"] = v_out
-                        ostate["Iout"] = i_out
-                        ostate["Pout"] = p_out
-                        ostate["P1"] = p1
-                        ostate["Temp"] = temp
-                        ostate["CV_CC"] = cv_cc
-                        ostate["Error"] = error
-                        ostate["Output"] = off_on
-
-                        # ret_val = [v_out, i_out, p_out, p1, temp, cv_cc, error, off_on]
-                        ret_val = ostate
-                        break
-        return ret_val
+        with self._io_lock:
+            self._stop_reader()
+            self.send("W")
+
+    def get_states_since(self, timestamp):
+        # all buffered samples (State) with time.time() stamp > timestamp
+        if self.ring is None:
+            return []
+        return self.ring.since(timestamp)
+
+    def get_state(self, timeout=0.5):
+        if self.is_streaming():
+            # latest sample from reader, wait only until the first report arrives
+            deadline = time.monotonic() + timeout
+            sample = self.ring.latest()
+            while sample is None and time.monotonic() < deadline and self.is_streaming():
+                time.sleep(0.005)
+                sample = self.ring.latest()
+            if sample is None:
+                return None
+            return state_to_dict(sample) if self.return_dicts else sample
+        # polled: buffered bytes go through the parser, the newest report is returned.
+        # A partial frame stays in the parser until the next call
+        with self._io_lock:
+            return self._poll_state(timeout)
+
+    def _poll_state(self, timeout):
+        deadline = time.monotonic() + timeout
+        report = None
+        while True:
+            waiting = self.ser.in_waiting
+            left = deadline - time.monotonic()
+            if not waiting and (report is not None or left <= 0):
+                break
+            chunk = self._read_bytes(max(1, waiting), max(0, min(left, self.idle_gap)))
+            for t, kind, frame in self.parser.feed(chunk, idle=not chunk):
+                if kind == "report":
+                    report = frame
+                elif kind == "junk":
+                    self.stats.bad_frame(frame)
+        if report is None:
+            return None
+        state = decode_report(report, time.time())
+        return state_to_dict(state) if self.return_dicts else state
@@ -0,0 +1,201 @@
+# Software regulation modes on top of dc6006l_class hardware CV/CC.
+# The loop runs at a fixed rate from streaming telemetry (power.ring) and
+# writes the voltage setpoint through set_v_out(wait=False), so a slow replay
+# never stalls the loop and repeated values are not sent at all.
+#
+# modes:
+#     "cp"    - constant power: v = sqrt(P * R_load), R_load = v_out / i_out
+#     "cr"    - source with series resistance: v = v_oc - r * i_out
+#     "track" - user setpoint: setpoint(t, state) -> voltage or (voltage, current)
+#
+# usage:
+#     power.enable_state_reporting()
+#     loop = control_loop(power, "cp", power_w=10, v_max=12, rate=20, slew=2.0)
+#     loop.start()
+#     ...
+#     loop.stop()
+#     print(loop.statistics())
+#
+
+import math
+import threading
+import time
+
+try:
+    from . import dc6006l_class as ps
+except ImportError:
+    import dc6006l_class as ps
+
+
+class control_loop:
+    def __init__(self, power, mode, rate=20.0, slew=1.0, v_min=0.0, v_max=None, i_max=None,
+                 p_max=None, power_w=None, v_oc=None, r=None, setpoint=None, i_min_load=0.005):
+        # rate - Hz, slew - V/s limit of setpoint change (None - no limit, not recommended)
+        # v_min/v_max, i_max, p_max - safety clamps, checked against range_check limits,
+        # v_max is required in cp mode, 60 V otherwise
+        # i_min_load - A, below that the load is treated as open (cp mode holds the setpoint,
+        # so cp starts from a nonzero voltage set before start())
+        if mode not in ("cp", "cr", "track"):
+            raise ValueError(f"Unknown control mode: {mode}")
+        if mode == "cp" and power_w is None:
+            raise ValueError("cp mode needs power_w")
+        if mode == "cp" and v_max is None:
+            raise ValueError("cp mode needs an explicit v_max")
+        if mode == "cr" and (v_oc is None or r is None):
+            raise ValueError("cr mode needs v_oc and r")
+        if mode == "track" and setpoint is None:
+            raise ValueError("track mode needs setpoint(t, state)")
+        self.power = power
+        self.mode = mode
+        self.period = 1.0 / rate
+        self.slew = slew
+        self.v_min = ps.range_check(v_min, 0, 60, "v_min")
+        self.v_max = ps.range_check(60.0 if v_max is None else v_max, self.v_min, 60, "v_max")
+        self.i_max = None if i_max is None else ps.range_check(i_max, 0, 6, "i_max")
+        self.p_max = p_max
+        self.power_w = power_w
+        self.v_oc = v_oc
+        self.r = r
+        self.setpoint = setpoint
+        self.i_min_load = i_min_load
+        self.v_cmd = None
+        self.i_cmd = None
+        self._thread = None
+        self._stop = threading.Event()
+        self._reset_stats()
+
+    def _reset_stats(self):
+        self.ticks = 0
+        self.late = 0  # ticks that started one or more periods late
+        self.stale = 0  # ticks without a new report since the previous one
+        self.clamped = 0  # setpoints limited by clamps or slew rate
+        self._period_sum = 0.0
+        self._period_sq = 0.0
+        self._period_min = None
+        self._period_max = None
+        self._jitter_max = 0.0
+        self._jitter_sum = 0.0
+
+    def start(self):
+        if not self.power.is_streaming():
+            print(f"{ps.bcolors.WARNING}control_loop: streaming is off, "
+                  f"call enable_state_reporting() first{ps.bcolors.ENDC}")
+            return False
+        if self._thread is not None:
+            return True
+        self._stop.clear()
+        self._reset_stats()
+        self._thread = threading.Thread(target=self._run, name="dc6006l_control", daemon=True)
+        self._thread.start()
+        return True
+
+    def stop(self):
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+        self.power.flush(self.power.reply_timeout)
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def target(self, t, state):
+        # unclamped (voltage, current) for the current state, None - unchanged
+        if self.mode == "cp":
+            if state.i_out < self.i_min_load:
+                return None, None  # open load, power is undefined: hold the setpoint
+            return math.sqrt(self.power_w * state.v_out / state.i_out), None
+        if self.mode == "cr":
+            return self.v_oc - self.r * state.i_out, None
+        sp = self.setpoint(t, state)
+        if isinstance(sp, tuple):
+            return sp
+        return sp, None
+
+    def clamp(self, v, i, state, dt):
+        v_req = v
+        v = min(max(v, self.v_min), self.v_max)
+        if self.p_max is not None and state.i_out > self.i_min_load:
+            v = min(v, self.p_max / state.i_out)
+        if self.slew is not None and self.v_cmd is not None:
+            step = self.slew * dt
+            v = min(max(v, self.v_cmd - step), self.v_cmd + step)
+        if i is not None:
+            i = min(max(i, 0.0), 6.0 if self.i_max is None else self.i_max)
+        if v != v_req:
+            self.clamped += 1
+        return v, i
+
+    def _run(self):
+        power = self.power
+        t_start = time.monotonic()
+        t_prev = None
+        seq_prev = power.ring.count()
+        k = 0
+        while not self._stop.is_set():
+            deadline = t_start + k * self.period
+            left = deadline - time.monotonic()
+            if left > 0 and self._stop.wait(left):
+                break
+            now = time.monotonic()
+            jitter = now - deadline
+            if jitter >= self.period:
+                # overrun, next tick is realigned to the schedule
+                self.late += 1
+                k += int(jitter / self.period)
+            k += 1
+            if t_prev is not None:
+                p = now - t_prev
+                self._period_sum += p
+                self._period_sq += p * p
+                self._period_min = p if self._period_min is None else min(self._period_min, p)
+                self._period_max = p if self._period_max is None else max(self._period_max, p)
+            self._jitter_sum += jitter
+            self._jitter_max = max(self._jitter_max, jitter)
+            dt = self.period if t_prev is None else now - t_prev
+            t_prev = now
+            self.ticks += 1
+            state = power.ring.latest()
+            seq = power.ring.count()
+            if state is None:
+                continue
+            if seq == seq_prev:
+                self.stale += 1
+            seq_prev = seq
+            if self.v_cmd is None:
+                # slew limit starts from the confirmed setpoint, or the measured output
+                self.v_cmd = power.cache.get("v_set", state.v_out)
+            v, i = self.target(now - t_start, state)
+            if v is None:
+                continue
+            v, i = self.clamp(v, i, state, dt)
+            self.v_cmd = v
+            power.set_v_out(round(v, 2), wait=False)
+            if i is not None and i != self.i_cmd:
+                self.i_cmd = i
+                power.set_i_out(i, wait=False)
+
+    def statistics(self):
+        # loop period and jitter (delay of a tick after its deadline), s
+        n = self.ticks - 1
+        mean = self._period_sum / n if n > 0 else None
+        std = math.sqrt(max(0.0, self._period_sq / n - mean * mean)) if n > 0 else None
+        return {
+            "ticks": self.ticks,
+            "period_nominal": self.period,
+            "period_mean": mean,
+            "period_std": std,
+            "period_min": self._period_min,
+            "period_max": self._period_max,
+            "jitter_mean": self._jitter_sum / self.ticks if self.ticks else None,
+            "jitter_max": self._jitter_max,
+            "late": self.late,
+            "stale": self.stale,
+            "clamped": self.clamped,
+            "v_cmd": self.v_cmd,
+        }
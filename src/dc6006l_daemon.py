@@ -0,0 +1,445 @@
+# Daemon that owns the serial port of one or more supplies and shares them
+# between processes over Unix domain sockets (one socket per supply).
+# Commands of all clients go through one priority queue per supply and every
+# client gets its own replies. Decoded telemetry is fanned out to subscribers.
+#
+# protocol: one json object per line
+#     request   {"id": 1, "method": "set_v_out", "args": [5], "kwargs": {}, "priority": 10}
+#     reply     {"id": 1, "result": true} or {"id": 1, "error": "ValueError", "message": "..."}
+#     subscribe {"id": 2, "method": "subscribe"}, then {"state": [State fields]} per report
+#
+# run from repository root:
+#     python -m src.dc6006l_daemon --port /dev/ttyUSB0 --port /dev/ttyUSB1
+#
+# client, the same API as dc6006l_class:
+#     power = dc6006l_client()
+#     power.init("/dev/ttyUSB0")       # socket of the daemon for this port
+#     power.set_v_out(5)
+#
+
+import argparse
+import builtins
+import itertools
+import json
+import os
+import queue
+import socket
+import threading
+
+try:
+    from . import dc6006l_class as ps
+except ImportError:
+    import dc6006l_class as ps
+
+SOCKET_DIR = "/tmp"
+DEFAULT_PRIORITY = 10  # lower value is executed first
+# dc6006l_class methods callable by clients
+METHODS = frozenset((
+    "set_v_out", "set_i_out", "flush", "invalidate_cache", "output_enable", "output_disable",
+    "output_switch", "get_status", "get_state", "get_states_since", "apply_config",
+    "set_volt_protect", "set_current_protect", "set_power_protect", "set_time_protect",
+    "time_protect_enable", "time_protect_disable", "query_frame", "send",
+))
+# raw commands of send/query_frame that are not passed: reporting is owned by the daemon,
+# "W" would stop telemetry of every subscriber
+RESERVED_COMMANDS = ("W", "Q")
+# dc6006l_class attributes readable by clients, stats as stats.snapshot()
+ATTRIBUTES = frozenset(("last_switch_latency", "cache", "stats"))
+
+
+def socket_path(com_port, socket_dir=SOCKET_DIR):
+    # /dev/ttyUSB0 -> /tmp/dc6006l-ttyUSB0.sock
+    name = os.path.basename(com_port.rstrip("/\\")) or "port"
+    return os.path.join(socket_dir, f"dc6006l-{name}.sock")
+
+
+def encode(value):
+    # State/Status records are sent as tagged lists
+    if isinstance(value, ps.State):
+        return {"__State__": list(value)}
+    if isinstance(value, ps.Status):
+        return {"__Status__": list(value)}
+    if isinstance(value, dict):
+        return {k: encode(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [encode(v) for v in value]
+    return value
+
+
+def decode(value):
+    if isinstance(value, dict):
+        if "__State__" in value:
+            return ps.State(*value["__State__"])
+        if "__Status__" in value:
+            return ps.Status(*value["__Status__"])
+        return {k: decode(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [decode(v) for v in value]
+    return value
+
+
+def _reserved_command(method, req):
+    if method not in ("send", "query_frame"):
+        return False
+    args = req.get("args") or ()
+    cmd = args[0] if args else (req.get("kwargs") or {}).get("cmd_str")
+    return isinstance(cmd, str) and cmd.strip().upper().startswith(RESERVED_COMMANDS)
+
+
+class _connection:
+    # one client of supply_server, replies and telemetry go out from its own thread
+    def __init__(self, sock, max_backlog):
+        self.sock = sock
+        self.out = queue.Queue()
+        self.max_backlog = max_backlog
+        self.subscribed = False
+        self.closed = False
+        self.dropped = 0
+        self._writer = threading.Thread(target=self._write_loop, name="dc6006l_daemon_tx", daemon=True)
+        self._writer.start()
+
+    def send(self, msg, droppable=False):
+        if self.closed:
+            return
+        if droppable and self.out.qsize() >= self.max_backlog:
+            # slow subscriber, telemetry is dropped, replies never
+            self.dropped += 1
+            return
+        self.out.put((json.dumps(msg) + "\n").encode())
+
+    def _write_loop(self):
+        while True:
+            data = self.out.get()
+            if data is None:
+                break
+            try:
+                self.sock.sendall(data)
+            except OSError:
+                break
+        self.closed = True
+
+    def close(self):
+        self.closed = True
+        self.out.put(None)
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.sock.close()
+
+
+class supply_server:
+    def __init__(self, power, path, max_backlog=1000):
+        # power - opened dc6006l_class, streaming is started by the server
+        self.power = power
+        self.path = path
+        self.max_backlog = max_backlog
+        self.clients = set()
+        self.commands = 0
+        self._queue = queue.PriorityQueue()
+        self._order = itertools.count()
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._sock = None
+        self._threads = []
+
+    def start(self):
+        if not self.power.is_streaming():
+            self.power.enable_state_reporting()
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._sock.bind(self.path)
+        self._sock.listen()
+        for target, name in ((self._accept_loop, "accept"), (self._command_loop, "commands"),
+                             (self._telemetry_loop, "telemetry")):
+            t = threading.Thread(target=target, name=f"dc6006l_daemon_{name}", daemon=True)
+            t.start()
+            self._threads.append(t)
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._queue.put((-1, -1, None, None))
+        try:
+            self._sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self._sock.close()
+        with self._lock:
+            clients = list(self.clients)
+        for conn in clients:
+            conn.close()
+        for t in self._threads:
+            t.join()
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+    def _accept_loop(self):
+        while not self._stop.is_set():
+            try:
+                sock, _ = self._sock.accept()
+            except OSError:
+                break
+            conn = _connection(sock, self.max_backlog)
+            with self._lock:
+                self.clients.add(conn)
+            threading.Thread(target=self._client_loop, args=(conn,), name="dc6006l_daemon_rx",
+                             daemon=True).start()
+
+    def _client_loop(self, conn):
+        try:
+            for line in conn.sock.makefile("rb"):
+                try:
+                    req = json.loads(line)
+                except ValueError:
+                    continue
+                if not isinstance(req, dict):
+                    continue
+                method = req.get("method")
+                if method == "subscribe":
+                    conn.subscribed = True
+                    conn.send({"id": req.get("id"), "result": True})
+                elif method == "unsubscribe":
+                    conn.subscribed = False
+                    conn.send({"id": req.get("id"), "result": True})
+                else:
+                    try:
+                        priority = int(req.get("priority", DEFAULT_PRIORITY))
+                    except (TypeError, ValueError, OverflowError):
+                        conn.send({"id": req.get("id"), "error": "ValueError",
+                                   "message": f"bad priority {req.get('priority')!r}"})
+                        continue
+                    self._queue.put((priority, next(self._order), conn, req))
+        except OSError:
+            pass
+        with self._lock:
+            self.clients.discard(conn)
+        conn.close()
+
+    def _command_loop(self):
+        # the only thread that talks to the supply
+        while True:
+            _, _, conn, req = self._queue.get()
+            if self._stop.is_set():
+                break
+            if conn.closed:
+                continue
+            reply = {"id": req.get("id")}
+            try:
+                reply["result"] = self._execute(req.get("method"), req)
+            except Exception as e:
+                # errors of a request (malformed ones included) go back to its client only
+                reply.update(error=type(e).__name__, message=str(e))
+            self.commands += 1
+            conn.send(reply)
+
+    def _execute(self, method, req):
+        args = req.get("args") or []
+        if method == "attribute":
+            name = args[0] if args else None
+            if name not in ATTRIBUTES:
+                raise AttributeError(f"unknown attribute {name}")
+            if name == "stats":
+                return self.power.stats.snapshot()
+            return encode(getattr(self.power, name))
+        if method not in METHODS:
+            raise AttributeError(f"unknown method {method}")
+        if _reserved_command(method, req):
+            raise PermissionError("reporting (W/Q) is owned by the daemon")
+        return encode(getattr(self.power, method)(*args, **(req.get("kwargs") or {})))
+
+    def _telemetry_loop(self):
+        ring = self.power.ring
+        seq = ring.count()
+        while not self._stop.is_set():
+            with self.power._state_cond:
+                self.power._state_cond.wait(0.1)
+            samples, seq, _ = ring.read_from(seq)
+            if not samples:
+                continue
+            with self._lock:
+                subscribers = [c for c in self.clients if c.subscribed]
+            for sample in samples:
+                msg = {"state": list(sample)}
+                for conn in subscribers:
+                    conn.send(msg, droppable=True)
+
+
+class _remote_stats:
+    # link_stats of the daemon connection, read only: hooks stay in the daemon process
+    def __init__(self, client):
+        self._client = client
+
+    def snapshot(self):
+        return self._client.call("attribute", "stats")
+
+    def export(self, path):
+        with open(path, "w") as f:
+            json.dump(self.snapshot(), f, indent=2)
+
+
+class dc6006l_client:
+    # the same API as dc6006l_class, commands are executed by the daemon.
+    # enable_state_reporting() subscribes to telemetry, samples go to the local .ring
+    def __init__(self):
+        self.sock = None
+        self.ring = None
+        self.ring_size = 4096
+        self.priority = DEFAULT_PRIORITY
+        self.call_timeout = 30.0
+        self.return_dicts = False
+        self._ids = itertools.count(1)
+        self._waiting = {}  # id -> [Event, reply]
+        self._lock = threading.Lock()
+        self._reader = None
+        self.stats = _remote_stats(self)
+
+    def init(self, com_port, check_port=True, socket_dir=SOCKET_DIR):
+        # com_port selects the daemon socket, check_port is ignored (daemon owns the port)
+        path = com_port if com_port.endswith(".sock") else socket_path(com_port, socket_dir)
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.connect(path)
+        except OSError as e:
+            print(f"{ps.bcolors.FAIL}No dc6006l daemon at {path}: {e}{ps.bcolors.ENDC}")
+            sock.close()
+            return False
+        self.sock = sock
+        self._reader = threading.Thread(target=self._read_loop, name="dc6006l_client", daemon=True)
+        self._reader.start()
+        return True
+
+    def close(self):
+        if self.sock is None:
+            return
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.sock.close()
+        self._reader.join()
+        self.sock = None
+
+    def _read_loop(self):
+        try:
+            for line in self.sock.makefile("rb"):
+                msg = json.loads(line)
+                if "state" in msg:
+                    if self.ring is not None:
+                        self.ring.push(ps.State(*msg["state"]))
+                    continue
+                with self._lock:
+                    waiter = self._waiting.pop(msg.get("id"), None)
+                if waiter is not None:
+                    waiter[1] = msg
+                    waiter[0].set()
+        except (OSError, ValueError):
+            pass
+        # connection lost, wake up all callers
+        with self._lock:
+            waiting, self._waiting = self._waiting, {}
+        for waiter in waiting.values():
+            waiter[0].set()
+
+    def call(self, method, *args, priority=None, **kwargs):
+        # executes power.method(*args, **kwargs) in the daemon and returns its result
+        if self.sock is None:
+            raise ConnectionError("dc6006l_client is not connected, call init() first")
+        req_id = next(self._ids)
+        waiter = [threading.Event(), None]
+        with self._lock:
+            self._waiting[req_id] = waiter
+        req = {"id": req_id, "method": method, "args": args, "kwargs": kwargs,
+               "priority": self.priority if priority is None else priority}
+        self.sock.sendall((json.dumps(req) + "\n").encode())
+        if not waiter[0].wait(self.call_timeout):
+            with self._lock:
+                self._waiting.pop(req_id, None)
+            raise TimeoutError(f"{method}: no replay from daemon")
+        reply = waiter[1]
+        if reply is None:
+            raise ConnectionError(f"{method}: connection to daemon lost")
+        if "error" in reply:
+            exc = getattr(builtins, reply["error"], None)
+            if not (isinstance(exc, type) and issubclass(exc, Exception)):
+                exc = RuntimeError
+            raise exc(reply["message"])
+        return decode(reply.get("result"))
+
+    def __getattr__(self, name):
+        if name in METHODS:
+            return lambda *args, **kwargs: self.call(name, *args, **kwargs)
+        raise AttributeError(name)
+
+    @property
+    def last_switch_latency(self):
+        return self.call("attribute", "last_switch_latency")
+
+    @property
+    def cache(self):
+        # copy of the daemon setpoint cache, see invalidate_cache()
+        return self.call("attribute", "cache")
+
+    def is_streaming(self):
+        return self.ring is not None
+
+    def enable_state_reporting(self, streaming=True):
+        # reporting of the supply is owned by the daemon, this only subscribes
+        if self.ring is None:
+            self.ring = ps.state_ring(self.ring_size)
+        self.call("subscribe")
+
+    def disable_state_reporting(self):
+        self.call("unsubscribe")
+        self.ring = None
+
+    def get_state(self, timeout=0.5):
+        if self.ring is None or self.ring.latest() is None:
+            state = self.call("get_state", timeout=timeout)
+        else:
+            state = self.ring.latest()
+        if state is not None and self.return_dicts:
+            return ps.state_to_dict(state)
+        return state
+
+    def get_states_since(self, timestamp):
+        if self.ring is None:
+            return self.call("get_states_since", timestamp)
+        return self.ring.since(timestamp)
+
+    def get_status(self, var_name="none", refresh=False):
+        status = self.call("get_status", var_name, refresh)
+        if self.return_dicts and isinstance(status, ps.Status):
+            return status.to_dict(legacy=True)
+        return status
+
+
+def serve(ports, socket_dir=SOCKET_DIR, check_port=True):
+    # opens every port and starts its server, returns list of supply_server
+    servers = []
+    for port in ports:
+        power = ps.dc6006l_class()
+        if not power.init(port, check_port):
+            print(f"{ps.bcolors.FAIL}Can not open {port}{ps.bcolors.ENDC}")
+            continue
+        server = supply_server(power, socket_path(port, socket_dir)).start()
+        print(f"{port} -> {server.path}")
+        servers.append(server)
+    return servers
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="share DC6006L supplies between processes")
+    parser.add_argument("--port", action="append", required=True, help="COM port, repeat for more supplies")
+    parser.add_argument("--socket-dir", default=SOCKET_DIR, help="directory of the Unix sockets")
+    parser.add_argument("--no-check-port", action="store_true", help="do not check the system port list")
+    a = parser.parse_args()
+    servers = serve(a.port, a.socket_dir, not a.no_check_port)
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        pass
+    for server in servers:
+        server.stop()
+        server.power.close()
@@ -0,0 +1,175 @@
+# Port discovery for DC6006L supplies.
+# Candidate ports (USB-serial bridge of the supply) are probed in parallel: the port
+# is opened exclusively (busy ports are skipped), "Q" is sent and the port is accepted
+# if a status or report frame comes back ("W" stops the reporting started by the probe).
+# USB VID/PID/serial number -> port mapping is cached on disk, so known supplies
+# are reopened without probing. Cache entry is dropped when the USB device is no
+# longer at the cached port or does not answer.
+#
+# usage:
+#     print(discover())
+#     power = open_by_serial("A50285BI")
+#
+
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import serial
+import serial.tools.list_ports
+
+try:
+    from . import dc6006l_class as ps
+except ImportError:
+    import dc6006l_class as ps
+
+CACHE_PATH = os.path.join(os.path.expanduser("~"), ".cache", "dc6006l", "ports.json")
+# (VID, PID) of the USB-serial bridge of the supply (WCH CH340/CH341, CH9102),
+# only these ports are probed by discover() without an explicit port list
+USB_IDS = {(0x1A86, 0x7523), (0x1A86, 0x5523), (0x1A86, 0x55D4)}
+
+
+def device_key(port_info):
+    # USB serial number if adapter has one, otherwise USB location (hub port)
+    if port_info.serial_number:
+        return f"{port_info.vid or 0:04X}:{port_info.pid or 0:04X}:{port_info.serial_number}"
+    if port_info.location:
+        return f"{port_info.vid or 0:04X}:{port_info.pid or 0:04X}:loc:{port_info.location}"
+    return None
+
+
+def load_cache(path=CACHE_PATH):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_cache(cache, path=CACHE_PATH):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(cache, f, indent=2)
+    os.replace(tmp, path)
+
+
+def probe(port, timeout=0.3, listen=0.1):
+    # short identification exchange, returns "status" / "report" or None.
+    # Busy ports (opened by another process) are skipped. A supply that already
+    # reports is recognised without commands, "W" is sent only after our own "Q"
+    try:
+        ser = serial.Serial(port=port, baudrate=115200, timeout=0, exclusive=True)
+    except (serial.SerialException, OSError, ValueError):
+        return None
+    parser = ps.frame_parser()
+
+    def wait_frame(kinds, until):
+        while time.monotonic() < until:
+            for t, kind, frame in parser.feed(ser.read(ser.in_waiting or 1)):
+                if kind in kinds:
+                    return kind
+            time.sleep(0.002)
+        return None
+
+    started = False
+    try:
+        ser.reset_input_buffer()
+        kind = wait_frame(("report",), time.monotonic() + min(listen, timeout))
+        if kind is not None:
+            return kind
+        ser.write(b"Q\r\n")
+        started = True
+        return wait_frame(("status", "report"), time.monotonic() + timeout)
+    except (serial.SerialException, OSError):
+        return None
+    finally:
+        if started:
+            try:
+                ser.write(b"W\r\n")
+                ser.flush()
+            except (serial.SerialException, OSError):
+                pass
+        ser.close()
+
+
+def discover(ports=None, timeout=0.3, cache_path=CACHE_PATH, usb_ids=USB_IDS):
+    # probes candidate ports in parallel, returns list of found supplies:
+    # {"port", "key", "vid", "pid", "serial_number", "location", "description"}
+    # ports=None - USB ports with (vid, pid) in usb_ids (None - all ports)
+    infos = {p.device: p for p in serial.tools.list_ports.comports()}
+    if ports is None:
+        ports = [p for p, info in infos.items() if usb_ids is None or (info.vid, info.pid) in usb_ids]
+    found = []
+    if not ports:
+        return found
+    with ThreadPoolExecutor(max_workers=len(ports)) as pool:
+        answers = list(pool.map(lambda p: probe(p, timeout), ports))
+    cache = load_cache(cache_path) if cache_path else {}
+    for port, answer in zip(ports, answers):
+        info = infos.get(port)
+        key = device_key(info) if info is not None else None
+        if answer is None:
+            # nothing answers at the cached port any more
+            for k in [k for k, v in cache.items() if v["port"] == port]:
+                del cache[k]
+            continue
+        entry = {
+            "port": port,
+            "key": key,
+            "vid": info.vid if info is not None else None,
+            "pid": info.pid if info is not None else None,
+            "serial_number": info.serial_number if info is not None else None,
+            "location": info.location if info is not None else None,
+            "description": info.description if info is not None else None,
+        }
+        found.append(entry)
+        if key is not None:
+            cache[key] = entry
+    if cache_path:
+        save_cache(cache, cache_path)
+    return found
+
+
+def find_port(serial_number=None, key=None, timeout=0.3, cache_path=CACHE_PATH):
+    # port of the supply with USB serial number (or device_key), None if not found.
+    # Cached entry is used when the same USB device is still at the cached port.
+    infos = {p.device: p for p in serial.tools.list_ports.comports()}
+
+    def matches(entry):
+        if key is not None:
+            return entry["key"] == key
+        return entry["serial_number"] == serial_number
+
+    cache = load_cache(cache_path) if cache_path else {}
+    for k, entry in list(cache.items()):
+        if not matches(entry):
+            continue
+        info = infos.get(entry["port"])
+        if info is not None and device_key(info) == k:
+            return entry["port"]
+        # device moved or was unplugged
+        del cache[k]
+        if cache_path:
+            save_cache(cache, cache_path)
+    # probe only the ports of that USB device
+    candidates = [p for p, info in infos.items()
+                  if (key is not None and device_key(info) == key) or
+                  (key is None and info.serial_number == serial_number)]
+    for entry in discover(candidates, timeout, cache_path):
+        if matches(entry):
+            return entry["port"]
+    return None
+
+
+def open_by_serial(serial_number=None, key=None, timeout=0.3, cache_path=CACHE_PATH):
+    # opened dc6006l_class or None
+    port = find_port(serial_number, key, timeout, cache_path)
+    if port is None:
+        print(f"{ps.bcolors.FAIL}DC6006L {serial_number or key} not found{ps.bcolors.ENDC}")
+        return None
+    power = ps.dc6006l_class()
+    if not power.init(port, check_port=False):
+        return None
+    return power
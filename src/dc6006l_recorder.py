@@ -0,0 +1,208 @@
+# Long-duration telemetry recorder: decoded samples are appended as fixed-width
+# binary records to a preallocated memory-mapped file, which grows in steps.
+# Memory use does not depend on the length of the run.
+#
+# file: 64 byte header (magic, version, record size, record count, start time)
+#       + records of dc6006l_batch.STATE_DTYPE (little endian, packed)
+#
+# usage:
+#     rec = telemetry_recorder("soak.dcl")
+#     rec.attach(power)            # power streaming, see enable_state_reporting()
+#     ...
+#     rec.close()
+#
+#     data = open_recording("soak.dcl")         # zero-copy numpy array
+#     part = data[seek(data, t_start):seek(data, t_stop)]
+#     replay = recording_replay("soak.dcl", speed=10)   # get_state() like a live supply
+#
+
+import mmap
+import os
+import struct
+import threading
+import time
+
+import numpy as np
+
+try:
+    from . import dc6006l_class as ps
+    from .dc6006l_batch import STATE_DTYPE
+except ImportError:
+    import dc6006l_class as ps
+    from dc6006l_batch import STATE_DTYPE
+
+MAGIC = b"DC6006L\0"
+VERSION = 1
+HEADER = struct.Struct("<8sHHIQd")
+HEADER_SIZE = 64
+RECORD = struct.Struct("<dddhbbbd")  # the same layout as STATE_DTYPE
+COUNT_OFFSET = 16  # offset of record count in the header
+
+assert RECORD.size == STATE_DTYPE.itemsize
+
+
+class telemetry_recorder:
+    def __init__(self, path, capacity=65536, grow=None):
+        # capacity - records preallocated, grow - records added when the file is full
+        self.path = path
+        self.grow = grow or capacity
+        self._lock = threading.Lock()
+        self._follower = None
+        self.lost = 0
+        if os.path.exists(path) and os.path.getsize(path) >= HEADER_SIZE:
+            # continue existing recording
+            self._f = open(path, "r+b")
+            magic, version, rec_size, _, count, start = HEADER.unpack(self._f.read(HEADER.size))
+            if magic != MAGIC or rec_size != RECORD.size:
+                self._f.close()
+                raise ValueError(f"{path} is not a dc6006l recording")
+            self.count = count
+            self.start_time = start
+            capacity = max(capacity, (os.path.getsize(path) - HEADER_SIZE) // RECORD.size)
+        else:
+            self._f = open(path, "w+b")
+            self.count = 0
+            self.start_time = time.time()
+        self.capacity = 0
+        self._mm = None
+        self._resize(max(capacity, self.count + 1))
+        HEADER.pack_into(self._mm, 0, MAGIC, VERSION, RECORD.size, 0, self.count, self.start_time)
+
+    def _resize(self, capacity):
+        if self._mm is not None:
+            self._mm.flush()
+            self._mm.close()
+        self._f.truncate(HEADER_SIZE + capacity * RECORD.size)
+        self._mm = mmap.mmap(self._f.fileno(), HEADER_SIZE + capacity * RECORD.size)
+        self.capacity = capacity
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def append(self, sample):
+        # sample - State of state_ring
+        with self._lock:
+            if self.count >= self.capacity:
+                self._resize(self.capacity + self.grow)
+            RECORD.pack_into(self._mm, HEADER_SIZE + self.count * RECORD.size,
+                             sample.v_out, sample.i_out, sample.p_out, sample.temp, sample.cv_cc,
+                             sample.error, sample.on_off, sample.timestamp)
+            self.count += 1
+            # count is published after the record, readers never see a half written one
+            struct.pack_into("<Q", self._mm, COUNT_OFFSET, self.count)
+
+    def extend(self, samples):
+        for sample in samples:
+            self.append(sample)
+
+    def attach(self, source, period=0.1):
+        # records every sample of source.ring (dc6006l_class with streaming on)
+        # from a background thread, lost - samples overwritten in the ring before recording
+        with self._lock:
+            self.lost = 0
+        self._follower = ps.ring_follower(source, self._follow, period, "dc6006l_recorder")
+
+    def _follow(self, samples, lost):
+        with self._lock:
+            self.lost += lost
+        self.extend(samples)
+
+    def detach(self):
+        if self._follower is not None:
+            self._follower.stop()
+            self._follower = None
+
+    def flush(self):
+        with self._lock:
+            self._mm.flush()
+
+    def close(self):
+        # file is truncated to the recorded samples
+        self.detach()
+        if self._mm is None:
+            return
+        with self._lock:
+            self._mm.flush()
+            self._mm.close()
+            self._mm = None
+            self._f.truncate(HEADER_SIZE + self.count * RECORD.size)
+            self._f.close()
+
+
+def read_header(path):
+    with open(path, "rb") as f:
+        magic, version, rec_size, _, count, start = HEADER.unpack(f.read(HEADER.size))
+    if magic != MAGIC or rec_size != RECORD.size:
+        raise ValueError(f"{path} is not a dc6006l recording")
+    return {"version": version, "count": count, "start_time": start}
+
+
+def open_recording(path):
+    # recorded samples as read-only numpy array of STATE_DTYPE, mapped, not loaded
+    count = read_header(path)["count"]
+    if count == 0:
+        return np.zeros(0, dtype=STATE_DTYPE)
+    return np.memmap(path, dtype=STATE_DTYPE, mode="r", offset=HEADER_SIZE, shape=(count,))
+
+
+def seek(data, timestamp):
+    # index of the first sample with timestamp >= given one
+    return int(np.searchsorted(data["timestamp"], timestamp, side="left"))
+
+
+def to_sample(record):
+    # record of STATE_DTYPE -> State (p1 is not recorded)
+    return ps.State(float(record["v_out"]), float(record["i_out"]), float(record["p_out"]), 0,
+                    int(record["temp"]), int(record["cv_cc"]), int(record["error"]),
+                    int(record["on_off"]), float(record["timestamp"]))
+
+
+class recording_replay:
+    # plays a recording into a state_ring: get_state(), get_states_since() and .ring
+    # behave like dc6006l_class with streaming on. speed - time scale, None - as fast as possible
+    def __init__(self, path, speed=1.0, start=None, stop=None, ring_size=4096):
+        self.data = open_recording(path)
+        self.ring = ps.state_ring(ring_size)
+        self.speed = speed
+        self._first = 0 if start is None else seek(self.data, start)
+        self._last = len(self.data) if stop is None else seek(self.data, stop)
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="dc6006l_replay", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        t0 = time.monotonic()
+        for k in range(self._first, self._last):
+            if self._stop.is_set():
+                break
+            sample = to_sample(self.data[k])
+            if self.speed:
+                deadline = t0 + (sample.timestamp - self.data[self._first]["timestamp"]) / self.speed
+                left = deadline - time.monotonic()
+                if left > 0 and self._stop.wait(left):
+                    break
+            self.ring.push(sample)
+
+    def is_streaming(self):
+        return self._thread.is_alive()
+
+    def wait(self, timeout=None):
+        self._thread.join(timeout)
+
+    def close(self):
+        self._stop.set()
+        self._thread.join()
+
+    def get_state(self, timeout=0.5):
+        deadline = time.monotonic() + timeout
+        sample = self.ring.latest()
+        while sample is None and time.monotonic() < deadline and self.is_streaming():
+            time.sleep(0.005)
+            sample = self.ring.latest()
+        return sample
+
+    def get_states_since(self, timestamp):
+        return self.ring.since(timestamp)
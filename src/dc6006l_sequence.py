@@ -0,0 +1,197 @@
+# Waveform/sequence playback for dc6006l_class.
+# Setpoints are compiled once into a command list and played against a
+# monotonic clock: every step has an absolute deadline t_start + t, so
+# command latency does not add up and the profile does not drift.
+#
+# usage:
+#     seq = compile_sequence([(0.0, 5, 1, 1), (0.5, 0, None, None), (1.3, 5, None, None)])
+#     result = play_sequence(power, seq, capture=True)
+#     print(result["duration"], max(result["late"]))
+#
+
+import time
+
+try:
+    from .dc6006l_class import v_out_cmd, i_out_cmd
+except ImportError:
+    from dc6006l_class import v_out_cmd, i_out_cmd
+
+
+def compile_sequence(steps, state=None):
+    # steps - list or array of (time, voltage, current, output), time in s from start,
+    # voltage/current/output None (or nan) - keep previous value. output: 1 - on, 0 - off.
+    # state - (voltage, current, output) already set on the supply, these commands are skipped.
+    # returns list of (time, [commands]), commands that do not change anything are dropped
+    v_prev, i_prev, out_prev = state if state is not None else (None, None, None)
+    compiled = []
+    t_prev = None
+    for step in steps:
+        t, v, i, out = (None if x is None or x != x else x for x in step)  # nan -> None
+        if t is None:
+            raise ValueError(f"Sequence time should be a number: {step[0]}")
+        if t_prev is not None and t < t_prev:
+            raise ValueError(f"Sequence time should not decrease: {t} < {t_prev}")
+        t_prev = t
+        cmds = []
+        if v is not None:
+            v, cmd = v_out_cmd(v)
+            if cmd != v_prev:
+                cmds.append(cmd)
+                v_prev = cmd
+        if i is not None:
+            i, cmd = i_out_cmd(i)
+            if cmd != i_prev:
+                cmds.append(cmd)
+                i_prev = cmd
+        if out is not None:
+            cmd = "N" if out else "F"
+            if cmd != out_prev:
+                cmds.append(cmd)
+                out_prev = cmd
+        compiled.append((float(t), cmds))
+    return compiled
+
+
+def meander(v_high, v_low, t_high, t_low, n_reps, current=None):
+    # steps of rectangular waveform for compile_sequence()
+    steps = []
+    period = t_high + t_low
+    for k in range(n_reps):
+        steps.append((k * period, v_high, current, None))
+        steps.append((k * period + t_high, v_low, None, None))
+    return steps
+
+
+def ramp(v_start, v_stop, v_step, t_step, current=None):
+    # steps of voltage ramp for compile_sequence()
+    n = int(round(abs(v_stop - v_start) / v_step))
+    sign = 1 if v_stop >= v_start else -1
+    return [(k * t_step, round(v_start + sign * k * v_step, 3), current if k == 0 else None, None)
+            for k in range(n + 1)]
+
+
+def pulses(t_on, t_off, n_pulses, voltage=None, current=None):
+    # steps of output on/off pulse train for compile_sequence(), output is off at the end
+    steps = [(0.0, voltage, current, None)] if voltage is not None or current is not None else []
+    period = t_on + t_off
+    for k in range(n_pulses):
+        steps.append((k * period, None, None, 1))
+        steps.append((k * period + t_on, None, None, 0))
+    return steps
+
+
+def output_edges(samples, prev=None):
+    # (timestamp, on_off) of every output change seen in telemetry samples,
+    # prev - output state before the first sample (None - unknown)
+    edges = []
+    for s in samples:
+        if s.on_off != prev:
+            if prev is not None:
+                edges.append((s.timestamp, s.on_off))
+            prev = s.on_off
+    return edges
+
+
+def _wait_until(deadline, spin=0.001):
+    # coarse sleep, then spin for the last millisecond
+    while True:
+        left = deadline - time.monotonic()
+        if left <= 0:
+            return
+        if left > spin:
+            time.sleep(left - spin)
+
+
+def _command_kind(cmd):
+    return "N" if cmd in ("N", "F") else cmd[0]
+
+
+def _play_command(power, cmd, confirm):
+    # returns 1 if a confirmed V/I command got no replay
+    if confirm and cmd[0] in "VI":
+        return int(power.query_frame(cmd, "echo") == "")
+    power.send(cmd)
+    return 0
+
+
+def play_sequence(power, sequence, confirm=False, capture=False, max_late=None):
+    # power - dc6006l_class, sequence - result of compile_sequence()
+    # confirm=False - commands are only written, confirm=True - V/I wait for the replay
+    # capture=True - telemetry received during playback is returned (streaming must be on)
+    # max_late - s, steps later than that are skipped (None - never skip). Commands of
+    # skipped steps are carried to the next played step (the latest V, I and output win),
+    # compile_sequence() dropped the repeats of them
+    # returns dict: late (s per step, None for skipped), duration, nominal, sent, skipped, failed, samples
+    late = []
+    sent = 0
+    skipped = 0
+    failed = 0
+    carry = {}  # "V" | "I" | "N" (output) -> command of a skipped step
+    seq_start = power.ring.count() if capture and power.ring is not None else None
+    wall_start = time.time()
+    t_start = time.monotonic()
+    for t, cmds in sequence:
+        deadline = t_start + t
+        _wait_until(deadline)
+        lateness = time.monotonic() - deadline
+        if max_late is not None and lateness > max_late:
+            late.append(None)
+            skipped += len(cmds)
+            for cmd in cmds:
+                carry[_command_kind(cmd)] = cmd
+            continue
+        late.append(lateness)
+        if carry:
+            for cmd in cmds:
+                carry.pop(_command_kind(cmd), None)
+            cmds = list(carry.values()) + cmds
+            carry.clear()
+        for cmd in cmds:
+            failed += _play_command(power, cmd, confirm)
+            sent += 1
+    # the end state of the profile is set even when the last steps were late
+    for cmd in carry.values():
+        failed += _play_command(power, cmd, confirm)
+        sent += 1
+    duration = time.monotonic() - t_start
+    result = {
+        "late": late,
+        "duration": duration,
+        "nominal": sequence[-1][0] if sequence else 0.0,
+        "sent": sent,
+        "skipped": skipped,
+        "failed": failed,
+        "start_time": wall_start,
+        "samples": None,
+    }
+    if seq_start is not None:
+        samples, next_seq, lost = power.ring.read_from(seq_start)
+        result["samples"] = samples
+        result["samples_lost"] = lost
+    return result
+
+
+def pulse_train(power, t_on, t_off, n_pulses, voltage=None, current=None, max_late=None):
+    # plays n_pulses output pulses with absolute deadlines, no confirmation round trip
+    # between edges, so pulses are as short as the supply can switch.
+    # With streaming on the pulses are measured from telemetry (resolution is the report period)
+    # returns play_sequence() result + edges [(timestamp, on_off)] and on_widths (s)
+    seq = compile_sequence(pulses(t_on, t_off, n_pulses, voltage, current))
+    streaming = power.is_streaming()
+    if streaming and power.ring.latest() is not None and power.ring.latest().on_off:
+        # output already on, start from a clean edge
+        power.output_disable()
+    seq_start = power.ring.count() if streaming else None
+    result = play_sequence(power, seq, max_late=max_late)
+    result["edges"] = None
+    result["on_widths"] = None
+    if streaming:
+        # the last off edge arrives one report later
+        power.wait_report(lambda s: s.on_off == 0, power.ring.count(), power.output_timeout)
+        samples, _, lost = power.ring.read_from(seq_start)
+        edges = output_edges(samples, prev=0)
+        result["samples"] = samples
+        result["samples_lost"] = lost
+        result["edges"] = edges
+        result["on_widths"] = [t1 - t0 for (t0, a), (t1, b) in zip(edges, edges[1:]) if a == 1 and b == 0]
+    return result
@@ -0,0 +1,242 @@
+# DC6006L power supply simulator on a Linux pseudo-terminal.
+# Protocol follows command_list.md: V/I/B/D/E/H/M/S/X/Y/N/F/Q/W commands,
+# 10 byte replay to V/I, "KB" status frame (66 bytes) after Q and periodic 27 byte reports.
+# Output is loaded by a resistor (load_r), CC mode is entered when v_set/load_r > i_set.
+#
+# usage:
+#     sim = dc6006l_sim(report_period=0.05, reply_delay=0.002)
+#     sim.start()
+#     power = ps.dc6006l_class()
+#     power.init(sim.port, check_port=False)
+#     ...
+#     sim.stop()
+#
+
+import os
+import pty
+import random
+import select
+import threading
+import time
+import tty
+
+
+class dc6006l_sim:
+    def __init__(self, report_period=0.05, reply_delay=0.002, jitter=0.0,
+                 corrupt_rate=0.0, load_r=10.0, seed=None):
+        self.report_period = report_period  # s, periodic report interval
+        self.reply_delay = reply_delay  # s, delay before replay to V/I
+        self.jitter = jitter  # s, random extra delay 0..jitter for replays and reports
+        self.corrupt_rate = corrupt_rate  # probability to damage a transmitted frame
+        self.load_r = load_r  # Ohm, None - no load
+        self.temp = 29
+        self._rnd = random.Random(seed)
+        # device state
+        self.v_set = 0.0
+        self.i_set = 0.0
+        self.v_lim = 61.0
+        self.i_lim = 6.1
+        self.p_lim = 360.0
+        self.tout_en = 0
+        self.tout_hh = 0
+        self.tout_mm = 0
+        self.tout_ss = 0
+        self.on_off = 0
+        self.error = 0
+        self.reporting = False
+        self._on_time = None
+        # statistics
+        self.commands = 0
+        self.frames_sent = 0
+        self.bytes_sent = 0
+        self.frames_corrupted = 0
+        self.port = None
+        self._master = None
+        self._slave = None
+        self._thread = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def start(self):
+        self._master, self._slave = pty.openpty()
+        tty.setraw(self._master)
+        tty.setraw(self._slave)
+        self.port = os.ttyname(self._slave)
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="dc6006l_sim", daemon=True)
+        self._thread.start()
+        return self.port
+
+    def stop(self):
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+        os.close(self._master)
+        os.close(self._slave)
+        self._master = None
+        self._slave = None
+
+    # --- model ---
+
+    def output(self):
+        # returns v_out, i_out, p_out, cv_cc
+        if not self.on_off:
+            return 0.0, 0.0, 0.0, 0
+        v_out = self.v_set
+        i_out = 0.0 if self.load_r is None else v_out / self.load_r
+        cv_cc = 0
+        if i_out > self.i_set:
+            cv_cc = 1
+            i_out = self.i_set
+            v_out = i_out * self.load_r
+        return v_out, i_out, v_out * i_out, cv_cc
+
+    def _check_protection(self):
+        if not self.on_off:
+            return
+        v_out, i_out, p_out, cv_cc = self.output()
+        if v_out > self.v_lim:
+            self._trip(1)
+        elif i_out > self.i_lim:
+            self._trip(2)
+        elif self.tout_en and self._on_time is not None:
+            tout = self.tout_hh * 3600 + self.tout_mm * 60 + self.tout_ss
+            if tout and time.monotonic() - self._on_time >= tout:
+                self._trip(3)
+
+    def _trip(self, error):
+        self.error = error
+        self.on_off = 0
+        self._on_time = None
+
+    def report_frame(self):
+        v_out, i_out, p_out, cv_cc = self.output()
+        return (f"{round(v_out * 100):04d}A{round(i_out * 1000):04d}A{round(p_out * 100):04d}A"
+                f"0A{self.temp:03d}A{cv_cc}A{self.error}A{self.on_off}A").encode()
+
+    def status_frame(self):
+        return (b"KB" + self.report_frame() +
+                (f"{round(self.v_set * 100):04d}A{round(self.i_set * 1000):04d}A"
+                 f"{round(self.v_lim * 100):04d}A{round(self.i_lim * 1000):04d}A"
+                 f"{round(self.p_lim * 100):05d}A{self.tout_en}A"
+                 f"{self.tout_hh:02d}A{self.tout_mm:02d}A{self.tout_ss:02d}A").encode())
+
+    def echo_frame(self):
+        return f"{round(self.v_set * 100):04d}A{round(self.i_set * 1000):04d}A".encode()
+
+    def command(self, cmd):
+        # executes one command line (without CR LF), returns replay bytes or None
+        self.commands += 1
+        if not cmd:
+            return None
+        letter = cmd[0]
+        arg = cmd[1:]
+        if arg and not arg.isdigit():
+            return None
+        val = int(arg) if arg else None
+        if letter == "V" and val is not None:
+            self.v_set = val / 100
+            return self.echo_frame()
+        if letter == "I" and val is not None:
+            self.i_set = val / 1000
+            return self.echo_frame()
+        if letter == "B" and val is not None:
+            self.v_lim = val / 100
+        elif letter == "D" and val is not None:
+            self.i_lim = val / 1000
+        elif letter == "E" and val is not None:
+            self.p_lim = val / 10
+        elif letter == "H" and val is not None:
+            self.tout_hh = val
+        elif letter == "M" and val is not None:
+            self.tout_mm = val
+        elif letter == "S" and val is not None:
+            self.tout_ss = val
+        elif letter == "X":
+            self.tout_en = 1
+        elif letter == "Y":
+            self.tout_en = 0
+        elif letter == "N":
+            if not self.on_off:
+                self._on_time = time.monotonic()
+            self.on_off = 1
+            self.error = 0
+        elif letter == "F":
+            self.on_off = 0
+            self._on_time = None
+        elif letter == "Q":
+            self.reporting = True
+            return self.status_frame()
+        elif letter == "W":
+            self.reporting = False
+        return None
+
+    # --- transport ---
+
+    def _delay(self, base):
+        if self.jitter:
+            base += self._rnd.uniform(0, self.jitter)
+        return base
+
+    def _corrupt(self, frame):
+        if self.corrupt_rate <= 0 or self._rnd.random() >= self.corrupt_rate:
+            return frame
+        self.frames_corrupted += 1
+        frame = bytearray(frame)
+        if self._rnd.random() < 0.5:
+            # truncated frame
+            return bytes(frame[:self._rnd.randrange(1, len(frame))])
+        frame[self._rnd.randrange(len(frame))] = self._rnd.choice(b"AZ#9")
+        return bytes(frame)
+
+    def _run(self):
+        rx = b""
+        pending = []  # (send_time, bytes)
+        next_report = time.monotonic()
+        while not self._stop.is_set():
+            now = time.monotonic()
+            timeout = 0.01
+            if pending:
+                timeout = min(timeout, max(0.0, pending[0][0] - now))
+            if self.reporting:
+                timeout = min(timeout, max(0.0, next_report - now))
+            r, _, _ = select.select([self._master], [], [], timeout)
+            if r:
+                try:
+                    rx += os.read(self._master, 1024)
+                except OSError:
+                    break
+                while b"\n" in rx:
+                    line, rx = rx.split(b"\n", 1)
+                    with self._lock:
+                        replay = self.command(line.strip(b"\r").decode(errors="replace"))
+                    if replay is not None:
+                        pending.append((time.monotonic() + self._delay(self.reply_delay), replay))
+                        pending.sort(key=lambda x: x[0])
+                        if line.startswith(b"Q"):
+                            next_report = pending[-1][0] + self.report_period
+            now = time.monotonic()
+            with self._lock:
+                self._check_protection()
+                while pending and pending[0][0] <= now:
+                    self._write(pending.pop(0)[1])
+                if self.reporting and now >= next_report:
+                    self._write(self.report_frame())
+                    next_report = max(next_report + self.report_period, now)
+                    next_report += self._delay(0.0)
+
+    def _write(self, frame):
+        self.frames_sent += 1
+        try:
+            self.bytes_sent += os.write(self._master, self._corrupt(frame))
+        except OSError:
+            pass
@@ -0,0 +1,143 @@
+# Settle-aware V-I sweep: every setpoint is held only until consecutive
+# reports agree within a tolerance, not for a fixed worst-case delay.
+# The CV -> CC knee can be refined by bisection between the coarse points.
+#
+# usage:
+#     power.enable_state_reporting()
+#     power.output_enable()
+#     curve = sweep(power, np.arange(0, 12.01, 0.5), tol_v=0.02, tol_i=0.002, refine=5)
+#     print(curve["setpoint"], curve["i_out"], curve["cv_cc"])
+#
+
+import collections
+import time
+
+import numpy as np
+
+try:
+    from . import dc6006l_class as ps
+except ImportError:
+    import dc6006l_class as ps
+
+SWEEP_DTYPE = np.dtype([
+    ("setpoint", np.float64),
+    ("v_out", np.float64),
+    ("i_out", np.float64),
+    ("p_out", np.float64),
+    ("cv_cc", np.int8),
+    ("error", np.int8),
+    ("settled", np.bool_),
+    ("settle_time", np.float64),  # s from the setpoint to the first frame of the stable run
+    ("timestamp", np.float64),
+])
+
+
+def follows(sample, setpoint, quantity, prev, tol_v, tol_i):
+    # True when the sample reflects the new setpoint: the supply regulates at it
+    # (CV at the voltage, CC at the current), is held below it by the other limit
+    # (the same output for any setpoint above, within tolerance), or the mode or
+    # output changed from prev, the last sample before the command
+    if quantity == "v":
+        if sample.cv_cc == 0 and abs(sample.v_out - setpoint) <= tol_v:
+            return True
+        if sample.cv_cc == 1 and sample.v_out <= setpoint + tol_v:
+            return True
+    else:
+        if sample.cv_cc == 1 and abs(sample.i_out - setpoint) <= tol_i:
+            return True
+        if sample.cv_cc == 0 and sample.i_out <= setpoint + tol_i:
+            return True
+    return prev is not None and (sample.cv_cc != prev.cv_cc or abs(sample.v_out - prev.v_out) > tol_v or
+                                 abs(sample.i_out - prev.i_out) > tol_i)
+
+
+def wait_settled(power, seq, t_cmd, tol_v=0.02, tol_i=0.002, n_stable=3, timeout=2.0,
+                 setpoint=None, quantity="v", prev=None):
+    # waits for n_stable reports after ring sequence number seq whose v_out and i_out
+    # stay within tol_v/tol_i (max - min over the run).
+    # with setpoint given the run starts only at a report that follows() it, so frames
+    # still showing the previous point do not pass as settled
+    # returns (last sample, settled, settle_time), the last seen sample on timeout
+    window = collections.deque(maxlen=n_stable)
+    last = [None]
+    fresh = [setpoint is None]
+
+    def stable(sample):
+        last[0] = sample
+        if not fresh[0]:
+            fresh[0] = follows(sample, setpoint, quantity, prev, tol_v, tol_i)
+            if not fresh[0]:
+                return False
+        window.append(sample)
+        if len(window) < n_stable:
+            return False
+        v = [s.v_out for s in window]
+        i = [s.i_out for s in window]
+        return max(v) - min(v) <= tol_v and max(i) - min(i) <= tol_i
+
+    sample = power.wait_report(stable, seq, timeout)
+    if sample is None:
+        return last[0], False, None
+    return sample, True, window[0].timestamp - t_cmd
+
+
+def _measure(power, setter, quantity, value, tol_v, tol_i, n_stable, timeout):
+    prev = power.ring.latest()
+    t_cmd = time.time()
+    setter(value)
+    seq = power.ring.count()
+    sample, settled, settle_time = wait_settled(power, seq, t_cmd, tol_v, tol_i, n_stable, timeout,
+                                                value, quantity, prev)
+    if sample is None:
+        return (value, np.nan, np.nan, np.nan, -1, -1, False, np.nan, np.nan)
+    return (value, sample.v_out, sample.i_out, sample.p_out, sample.cv_cc, sample.error, settled,
+            np.nan if settle_time is None else settle_time, sample.timestamp)
+
+
+def sweep(power, setpoints, quantity="v", tol_v=0.02, tol_i=0.002, n_stable=3, timeout=2.0,
+          refine=0, min_step=None):
+    # power - dc6006l_class with streaming on and output enabled
+    # setpoints - voltages (quantity="v") or current limits (quantity="i") in sweep order
+    # refine - bisection steps between every pair of neighbour points where CV/CC changes,
+    # min_step - stop refining when the interval is smaller
+    # returns SWEEP_DTYPE array sorted by setpoint
+    if quantity not in ("v", "i"):
+        raise ValueError(f"Unknown sweep quantity: {quantity}")
+    if not power.is_streaming():
+        print(f"{ps.bcolors.WARNING}sweep: streaming is off, "
+              f"call enable_state_reporting() first{ps.bcolors.ENDC}")
+        return None
+    setter = power.set_v_out if quantity == "v" else power.set_i_out
+    digits = 2 if quantity == "v" else 3  # resolution of V/I commands
+    if min_step is None:
+        min_step = 10 ** -digits
+
+    def measure(value):
+        return _measure(power, setter, quantity, value, tol_v, tol_i, n_stable, timeout)
+
+    rows = [measure(float(x)) for x in setpoints]
+    if refine:
+        coarse = sorted(rows, key=lambda r: r[0])
+        for lo, hi in zip(coarse, coarse[1:]):
+            if lo[4] == hi[4] or lo[4] < 0 or hi[4] < 0:
+                continue
+            # the knee is between lo and hi, keep the half where the mode changes
+            for _ in range(refine):
+                if hi[0] - lo[0] < 2 * min_step - 1e-9:
+                    break
+                mid = measure(round((lo[0] + hi[0]) / 2, digits))
+                rows.append(mid)
+                if mid[4] == lo[4]:
+                    lo = mid
+                else:
+                    hi = mid
+    curve = np.array(rows, dtype=SWEEP_DTYPE)
+    return curve[np.argsort(curve["setpoint"], kind="stable")]
+
+
+def knees(curve):
+    # setpoints where CV/CC mode changes between neighbour points of a sweep curve,
+    # midpoint of the narrowest measured interval
+    mode = curve["cv_cc"]
+    k = np.flatnonzero(mode[1:] != mode[:-1])
+    return (curve["setpoint"][k] + curve["setpoint"][k + 1]) / 2
@@ -0,0 +1,208 @@
+# Triggers evaluated on every report frame of a streaming dc6006l_class.
+# Conditions run in the telemetry reader thread (power.report_hooks), so an
+# action is taken within one report period. "output_disable"/"output_enable"
+# actions write the command right there, callbacks run on a worker thread so
+# a slow callback does not stall telemetry. Every event keeps the samples
+# around the trigger (pre/post), taken from the telemetry ring.
+#
+# usage:
+#     engine = trigger_engine(power)       # power streaming, see enable_state_reporting()
+#     engine.add(threshold("i_out", 0.01, "below", hysteresis=0.005), action=restart, pre=50, post=50)
+#     engine.add(error_code(), action="output_disable")
+#     engine.attach()
+#     ...
+#     engine.detach()
+#     print(engine.events[-1]["pre"])
+#
+
+import queue
+import threading
+
+try:
+    from . import dc6006l_class as ps
+except ImportError:
+    import dc6006l_class as ps
+
+ERROR_CODES = {"ov": 1, "oc": 2, "ot": 3}
+MODES = {"cv": 0, "cc": 1}
+# actions written from the reader thread without waiting for confirmation
+COMMAND_ACTIONS = {"output_disable": "F", "output_enable": "N"}
+
+
+class threshold:
+    # fires when field goes above (below) level, re-armed after it is back
+    # below level - hysteresis (above level + hysteresis)
+    def __init__(self, field, level, direction="above", hysteresis=0.0):
+        if direction not in ("above", "below"):
+            raise ValueError(f"Unknown direction: {direction}")
+        self.field = field
+        self.level = level
+        self.direction = direction
+        self.hysteresis = hysteresis
+        self.armed = True
+
+    def __call__(self, prev, sample):
+        x = getattr(sample, self.field)
+        if self.direction == "above":
+            hit, rearm = x > self.level, x < self.level - self.hysteresis
+        else:
+            hit, rearm = x < self.level, x > self.level + self.hysteresis
+        if self.armed and hit:
+            self.armed = False
+            return True
+        if rearm:
+            self.armed = True
+        return False
+
+
+class mode_change:
+    # CV <-> CC transition, to - "cv", "cc" or None (both)
+    def __init__(self, to=None):
+        self.to = None if to is None else MODES[to]
+
+    def __call__(self, prev, sample):
+        return (prev is not None and sample.cv_cc != prev.cv_cc
+                and (self.to is None or sample.cv_cc == self.to))
+
+
+class error_code:
+    # protection trip: error changes to one of codes ("ov", "oc", "ot")
+    def __init__(self, codes=("ov", "oc", "ot")):
+        self.codes = frozenset(ERROR_CODES[c] for c in codes)
+
+    def __call__(self, prev, sample):
+        return sample.error in self.codes and (prev is None or prev.error != sample.error)
+
+
+class rate:
+    # |d field / dt| above limit (units per s) from two consecutive frames,
+    # direction "rise", "fall" or "both". Re-armed when the rate is back under limit
+    def __init__(self, field, limit, direction="both"):
+        if direction not in ("rise", "fall", "both"):
+            raise ValueError(f"Unknown direction: {direction}")
+        self.field = field
+        self.limit = limit
+        self.direction = direction
+        self.armed = True
+
+    def __call__(self, prev, sample):
+        if prev is None:
+            return False
+        dt = sample.timestamp - prev.timestamp
+        if dt <= 0:
+            return False
+        r = (getattr(sample, self.field) - getattr(prev, self.field)) / dt
+        if self.direction == "rise":
+            hit = r > self.limit
+        elif self.direction == "fall":
+            hit = -r > self.limit
+        else:
+            hit = abs(r) > self.limit
+        if self.armed and hit:
+            self.armed = False
+            return True
+        if not hit:
+            self.armed = True
+        return False
+
+
+class trigger_engine:
+    def __init__(self, power, max_events=100):
+        self.power = power
+        self.triggers = []
+        self.events = []  # completed events, the last max_events
+        self.max_events = max_events
+        self._prev = None
+        self._capturing = []  # (seq of trigger sample, post, on_capture, event) waiting for post samples
+        self._lock = threading.Lock()
+        self._jobs = queue.Queue()
+        self._worker = None
+
+    def add(self, condition, action=None, pre=0, post=0, once=False, name=None, on_capture=None):
+        # condition(prev, sample) -> bool, see threshold, mode_change, error_code, rate
+        # action - callable(event) or "output_disable"/"output_enable"
+        # pre/post - samples kept before/after the trigger (pre is limited by the ring size)
+        # on_capture(event) - called when post-trigger samples are complete
+        if isinstance(action, str) and action not in COMMAND_ACTIONS:
+            raise ValueError(f"Unknown action: {action}")
+        trig = {"name": name or f"trigger{len(self.triggers)}", "condition": condition, "action": action,
+                "pre": pre, "post": post, "once": once, "on_capture": on_capture, "count": 0}
+        with self._lock:
+            self.triggers.append(trig)
+        return trig
+
+    def remove(self, trig):
+        with self._lock:
+            self.triggers.remove(trig)
+
+    def attach(self):
+        if not self.power.is_streaming():
+            print(f"{ps.bcolors.WARNING}trigger_engine: streaming is off, "
+                  f"call enable_state_reporting() first{ps.bcolors.ENDC}")
+            return False
+        self._prev = None
+        self._worker = threading.Thread(target=self._run_jobs, name="dc6006l_trigger", daemon=True)
+        self._worker.start()
+        self.power.report_hooks.append(self._on_report)
+        return True
+
+    def detach(self):
+        if self._on_report in self.power.report_hooks:
+            self.power.report_hooks.remove(self._on_report)
+        if self._worker is not None:
+            self._jobs.put(None)
+            self._worker.join()
+            self._worker = None
+
+    def _run_jobs(self):
+        while True:
+            job = self._jobs.get()
+            if job is None:
+                break
+            func, event = job
+            try:
+                func(event)
+            except Exception as e:
+                print(f"{ps.bcolors.FAIL}Trigger {event['name']}: {e}{ps.bcolors.ENDC}")
+
+    def _on_report(self, sample):
+        # reader thread: the sample is already the latest one in the ring
+        ring = self.power.ring
+        seq = ring.count() - 1
+        prev, self._prev = self._prev, sample
+        with self._lock:
+            fired = [t for t in self.triggers if t["condition"](prev, sample)]
+            for trig in fired:
+                trig["count"] += 1
+                if trig["once"]:
+                    self.triggers.remove(trig)
+            capturing = self._capturing
+            done = [c for c in capturing if seq >= c[0] + c[1]]
+            if done:
+                self._capturing = [c for c in capturing if seq < c[0] + c[1]]
+        for trig in fired:
+            action = trig["action"]
+            if isinstance(action, str):
+                self.power._write_cmd(COMMAND_ACTIONS[action])
+            pre = ring.read_from(max(0, seq - trig["pre"]))[0][:-1]
+            event = {"name": trig["name"], "timestamp": sample.timestamp, "sample": sample, "prev": prev,
+                     "pre": pre, "post": []}
+            if callable(action):
+                self._jobs.put((action, event))
+            capture = (seq, trig["post"], trig["on_capture"], event)
+            if trig["post"]:
+                with self._lock:
+                    self._capturing.append(capture)
+            else:
+                done.append(capture)
+        for capture in done:
+            self._complete(*capture)
+
+    def _complete(self, seq, post, on_capture, event):
+        if post:
+            event["post"] = self.power.ring.read_from(seq + 1)[0][:post]
+        with self._lock:
+            self.events.append(event)
+            del self.events[:-self.max_events]
+        if on_capture is not None:
+            self._jobs.put((on_capture, event))
@@ -0,0 +1,33 @@
+import os
+import sys
+
+import pytest
+
+# modules of src/ are imported the way the examples do, without a package
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+
+@pytest.fixture
+def sim():
+    # simulated supply on a pseudo-terminal (Linux)
+    pytest.importorskip("pty")
+    from dc6006l_sim import dc6006l_sim
+    with dc6006l_sim(report_period=0.01) as s:
+        yield s
+
+
+@pytest.fixture
+def power(sim):
+    import dc6006l_class as ps
+    p = ps.dc6006l_class()
+    assert p.init(sim.port, check_port=False)
+    yield p
+    if p.ser is not None:
+        p.close()
+
+
+@pytest.fixture
+def streaming(power):
+    power.enable_state_reporting()
+    assert power.wait_report(lambda s: True, 0, 1.0) is not None
+    return power
@@ -0,0 +1,75 @@
+import asyncio
+import time
+
+from dc6006l_async import AsyncDC6006L
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_commands(sim):
+    async def main():
+        p = AsyncDC6006L()
+        assert await p.open(sim.port, check_port=False)
+        try:
+            assert await p.set_v_out(5) and await p.set_i_out(1.2)
+            assert await p.output_enable()
+            state = await p.get_state()
+            status = await p.get_status()
+            res = await p.apply_config(v_lim=20, i_lim=3)
+        finally:
+            await p.close()
+        return state, status, res
+
+    state, status, res = run(main())
+    assert state.on_off == 1 and (status.v_set, status.i_set) == (5.0, 1.2)
+    assert res["ok"] and (sim.v_lim, sim.i_lim) == (20.0, 3.0)
+
+
+def test_many_supplies_on_one_loop(sim):
+    from dc6006l_sim import dc6006l_sim
+
+    async def main(ports):
+        supplies = [AsyncDC6006L() for _ in ports]
+        assert all(await asyncio.gather(*(s.open(port, check_port=False) for s, port in zip(supplies, ports))))
+        ok = await asyncio.gather(*(s.set_v_out(2 + k) for k, s in enumerate(supplies)))
+        await asyncio.gather(*(s.close() for s in supplies))
+        return ok
+
+    with dc6006l_sim(report_period=0.01) as other:
+        assert run(main([sim.port, other.port])) == [True, True]
+        assert (sim.v_set, other.v_set) == (2.0, 3.0)
+
+
+def test_read_error_stops_reader_and_wakes_waiters(sim):
+    async def main():
+        p = AsyncDC6006L()
+        assert await p.open(sim.port, check_port=False)
+        assert await p.next_state() is not None
+        calls = [0]
+        on_readable = p._on_readable
+
+        def counting():
+            calls[0] += 1
+            on_readable()
+
+        p._loop.remove_reader(p._reader_fd)
+        p._loop.add_reader(p._reader_fd, counting)
+        waiter = asyncio.ensure_future(p.query_frame("N", "status", timeout=3))  # no replay
+        await asyncio.sleep(0.05)
+        sim.stop()
+        t = time.monotonic()
+        reply = await waiter
+        elapsed = time.monotonic() - t
+        n = calls[0]
+        await asyncio.sleep(0.1)
+        state = await p.next_state(1.0)
+        spins = calls[0] - n
+        await p.close()
+        return reply, elapsed, state, spins, p.read_error
+
+    reply, elapsed, state, spins, error = run(main())
+    assert reply == "" and elapsed < 0.5
+    assert state is None and spins == 0
+    assert isinstance(error, OSError)
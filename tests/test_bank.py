@@ -0,0 +1,41 @@
+import pytest
+
+from dc6006l_bank import SupplyBank
+
+
+def test_empty_bank():
+    bank = SupplyBank({"ch1": "/dev/dc6006l-missing"})
+    assert len(bank) == 0
+    for res in (bank.set_all(v=5), bank.enable_all(), bank.disable_all()):
+        assert res == {"ok": False, "devices": {}, "skew": None, "duration": 0.0}
+    bank.close()
+
+
+@pytest.fixture
+def bank():
+    pytest.importorskip("pty")
+    from dc6006l_sim import dc6006l_sim
+    with dc6006l_sim(report_period=0.01) as a, dc6006l_sim(report_period=0.01) as b:
+        bank = SupplyBank({"a": a.port, "b": b.port}, check_port=False)
+        yield bank, a, b
+        bank.close()
+
+
+def test_set_all_and_switch(bank):
+    bank, a, b = bank
+    res = bank.set_all(v=5, i=1)
+    assert res["ok"] and a.v_set == b.v_set == 5.0 and a.i_set == b.i_set == 1.0
+    assert bank.enable_all()["ok"] and a.on_off == b.on_off == 1
+    assert bank.disable_all(names=["a"])["ok"] and a.on_off == 0 and b.on_off == 1
+
+
+def test_skew_is_taken_from_the_writes(bank):
+    bank, a, b = bank
+    res = bank.set_all(v=3)
+    # one command per device: the write stamps are the last command times
+    t = {name: bank[name]._last_cmd_time for name in ("a", "b")}
+    assert res["skew"] == pytest.approx(abs(t["a"] - t["b"]), abs=1e-9)
+    t0 = min(t.values())
+    for name, dev in res["devices"].items():
+        assert dev["write_offset"] == pytest.approx(t[name] - t0, abs=1e-9)
+        assert dev["latency"] > 0
@@ -0,0 +1,36 @@
+import math
+import time
+
+import pytest
+
+from dc6006l_control import control_loop
+
+
+def test_cp_needs_v_max(power):
+    with pytest.raises(ValueError):
+        control_loop(power, "cp", power_w=5)
+
+
+def test_constant_power(streaming, sim):
+    assert streaming.set_v_out(1) and streaming.set_i_out(2) and streaming.output_enable()
+    with control_loop(streaming, "cp", power_w=5, v_max=12, rate=50, slew=50) as loop:
+        time.sleep(0.6)
+    stats = loop.statistics()
+    assert sim.v_set == pytest.approx(math.sqrt(5 * sim.load_r), abs=0.05)
+    assert stats["ticks"] > 20 and stats["period_mean"] == pytest.approx(0.02, abs=0.005)
+
+
+def test_cp_holds_on_open_load(streaming, sim):
+    sim.load_r = None
+    assert streaming.set_v_out(1) and streaming.output_enable()
+    with control_loop(streaming, "cp", power_w=5, v_max=12, rate=50):
+        time.sleep(0.2)
+    assert sim.v_set == 1.0
+
+
+def test_slew_limit(streaming, sim):
+    assert streaming.set_v_out(0) and streaming.output_enable()
+    with control_loop(streaming, "track", setpoint=lambda t, s: 10.0, rate=50, slew=5.0) as loop:
+        time.sleep(0.4)
+    assert 1.0 <= sim.v_set <= 2.5
+    assert loop.statistics()["clamped"] > 0
@@ -0,0 +1,62 @@
+import json
+import socket
+import time
+
+import pytest
+
+from dc6006l_daemon import dc6006l_client, socket_path, supply_server
+
+
+@pytest.fixture
+def server(streaming, tmp_path):
+    srv = supply_server(streaming, socket_path(streaming.ser.port, str(tmp_path))).start()
+    yield srv
+    srv.stop()
+
+
+@pytest.fixture
+def client(server):
+    c = dc6006l_client()
+    assert c.init(server.path)
+    yield c
+    c.close()
+
+
+def test_commands_and_attributes(client, sim):
+    client.enable_state_reporting()
+    assert client.set_v_out(5)
+    assert client.output_enable()
+    assert sim.v_set == 5.0 and sim.on_off == 1
+    assert client.last_switch_latency is not None
+    assert client.cache["v_set"] == 5.0
+    assert client.stats.snapshot()["commands"]["V"] == 1
+    deadline = time.monotonic() + 0.5
+    while client.get_state().on_off != 1 and time.monotonic() < deadline:
+        time.sleep(0.01)  # the local ring follows the telemetry of the daemon
+    assert client.get_state().on_off == 1
+
+
+def test_reporting_commands_are_rejected(client, server, sim):
+    for cmd in ("W", " w", "Q"):
+        with pytest.raises(PermissionError):
+            client.send(cmd)
+    with pytest.raises(PermissionError):
+        client.query_frame("Q", "status")
+    assert sim.reporting
+    count = server.power.ring.count()
+    time.sleep(0.1)
+    assert server.power.ring.count() > count
+
+
+def test_bad_priority_gets_an_error(client, server):
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.connect(server.path)
+    f = sock.makefile("rb")
+    for k, priority in enumerate((None, "high", [1])):
+        sock.sendall((json.dumps({"id": k, "method": "get_state", "priority": priority}) + "\n").encode())
+        assert json.loads(f.readline())["error"] == "ValueError"
+    sock.sendall(b'{"id": 9, "method": "get_state", "args": 5}\n')
+    assert "error" in json.loads(f.readline())
+    sock.close()
+    # the command loop still serves other clients
+    assert client.set_v_out(3)
@@ -0,0 +1,229 @@
+# Regression tests driven by dc6006l_sim (Linux pseudo-terminal).
+#     python -m pytest -q
+
+import threading
+import time
+
+import numpy as np
+import pytest
+
+import dc6006l_class as ps
+from dc6006l_batch import decode_reports
+from dc6006l_recorder import open_recording, read_header, telemetry_recorder, to_sample
+
+REPORT = b"0199A0700A0139A0A029A0A0A1A"
+ECHO = b"0500A0500A"
+
+
+def kinds(frames):
+    return [(kind, bytes(frame)) for _, kind, frame in frames]
+
+
+def test_parser_resync_after_garbage():
+    parser = ps.frame_parser()
+    frames = parser.feed(b"#Z9" + REPORT + REPORT[:20] + b"\r\n" + REPORT, idle=True)
+    assert [kind for _, kind, _ in frames] == ["junk", "report", "junk", "report"]
+    assert parser.pending() == 0
+
+
+def test_parser_split_feed():
+    parser = ps.frame_parser()
+    data = REPORT + ECHO + REPORT
+    frames = []
+    for k in range(len(data)):
+        frames += parser.feed(data[k:k + 1])
+    frames += parser.feed(b"", idle=True)
+    assert kinds(frames) == [("report", REPORT), ("echo", ECHO), ("report", REPORT)]
+
+
+def test_parser_truncated_report_is_not_echo():
+    parser = ps.frame_parser()
+    frames = kinds(parser.feed(REPORT[:12] + REPORT, idle=True))
+    assert ("report", REPORT) in frames
+    assert all(kind != "echo" for kind, _ in frames)
+
+
+def test_parser_echo_at_end_of_data():
+    parser = ps.frame_parser()
+    assert kinds(parser.feed(ECHO)) == []
+    assert kinds(parser.feed(b"", idle=True)) == [("echo", ECHO)]
+
+
+def test_decode_reports_matches_decode_report(sim):
+    frames = []
+    for v_set, i_set, on_off in ((0, 0, 0), (5, 1, 1), (12.34, 0.5, 1), (30.01, 2.345, 1)):
+        sim.v_set, sim.i_set, sim.on_off = v_set, i_set, on_off
+        frames.append(sim.report_frame())
+    data = b"".join(frames[:2]) + b"\r\n#" + frames[2] + frames[3][:15] + frames[3]
+    out = decode_reports(data, t0=0.0, period=1.0)
+    expected = [ps.decode_report(f) for f in (frames[0], frames[1], frames[2], frames[3])]
+    assert len(out) == len(expected)
+    for row, state in zip(out, expected):
+        for field in ("v_out", "i_out", "p_out", "temp", "cv_cc", "error", "on_off"):
+            assert row[field] == pytest.approx(getattr(state, field))
+
+
+def test_recorder_round_trip(tmp_path):
+    path = str(tmp_path / "run.dcl")
+    samples = [ps.State(k / 100, k / 1000, k / 10, 0, 30 + k % 5, k % 2, 0, 1, 1000.0 + k * 0.05)
+               for k in range(10)]
+    with telemetry_recorder(path, capacity=4, grow=4) as rec:
+        rec.extend(samples[:6])
+    with telemetry_recorder(path) as rec:
+        # continues the existing recording
+        rec.extend(samples[6:])
+    assert read_header(path)["count"] == len(samples)
+    data = open_recording(path)
+    assert [to_sample(r) for r in data] == samples
+    assert np.all(np.diff(data["timestamp"]) > 0)
+
+
+def test_apply_config_verified(power, sim):
+    res = power.apply_config(v_lim=20, i_lim=3, p_lim=50.5, timeout_mm=10, timeout_en=False)
+    assert res["ok"], res["failed"]
+    assert (sim.v_lim, sim.i_lim, sim.p_lim, sim.tout_mm) == (20.0, 3.0, 50.5, 10)
+    assert res["status"].v_lim == 20.0
+    assert power.cache["i_lim"] == 3.0
+
+
+def test_apply_config_reports_failed_field(power, sim):
+    command = sim.command
+
+    def ignore_current_limit(cmd):
+        # supply that does not take the current protection command
+        return None if cmd.startswith("D") else command(cmd)
+
+    sim.command = ignore_current_limit
+    i_lim = sim.i_lim
+    res = power.apply_config(v_lim=20, i_lim=3)
+    assert not res["ok"]
+    assert res["failed"] == {"i_lim": (3.0, i_lim)}
+
+
+def test_unverified_config_survives_next_command(power, sim):
+    # apply_config(verify=False) returns with the commands possibly still queued,
+    # the next command must not discard them
+    for k in range(30):
+        v_lim = 20 + k / 10
+        power.apply_config(verify=False, v_lim=v_lim, i_lim=3, timeout_mm=k % 60)
+        power.send("N" if k % 2 else "F")
+        status = power.get_status(refresh=True)
+        assert (status.v_lim, status.i_lim, status.timeout_mm) == (v_lim, 3.0, k % 60)
+
+
+def test_background_setpoints_with_polled_state(power, sim):
+    # the wait=False flusher and polled get_state() share the port
+    power.enable_state_reporting(streaming=False)
+    stop = threading.Event()
+
+    def poll():
+        while not stop.is_set():
+            power.get_state(timeout=0.02)
+
+    poller = threading.Thread(target=poll)
+    poller.start()
+    try:
+        for k in range(40):
+            power.set_v_out(1 + k / 10, wait=False)
+            time.sleep(0.01)
+        assert power.flush(2.0)
+    finally:
+        stop.set()
+        poller.join()
+    assert power.stats.timeouts.get("V", 0) == 0
+    assert sim.v_set == 4.9
+    assert power.cache["v_set"] == 4.9
+
+
+def test_streaming_counts_received_bytes_once(sim):
+    # corrupted frames leave partial frames pending in the reader
+    sim.corrupt_rate = 0.3
+    p = ps.dc6006l_class()
+    assert p.init(sim.port, check_port=False)
+    p.enable_state_reporting()
+    time.sleep(0.5)
+    sim.reporting = False
+    time.sleep(0.1)
+    try:
+        assert p.stats.bytes_in == sim.bytes_sent
+    finally:
+        p.close()
+
+
+def test_ring_read_from_keeps_size_minus_one():
+    ring = ps.state_ring(4)
+    for k in range(10):
+        ring.push(k)
+    samples, seq, lost = ring.read_from(0)
+    assert (samples, seq, lost) == ([7, 8, 9], 10, 7)
+    assert ring.read_from(9) == ([9], 10, 0)
+    assert ring.latest() == 9
+
+
+def test_streaming_reader_fills_ring(streaming, sim):
+    sim.corrupt_rate = 0.2
+    seq = streaming.ring.count()
+    time.sleep(0.3)
+    samples, _, lost = streaming.ring.read_from(seq)
+    assert lost == 0 and len(samples) > 10
+    stamps = [s.timestamp for s in samples]
+    # per-frame arrival times, not one time per read chunk
+    assert stamps == sorted(stamps) and len(set(stamps)) > len(stamps) // 2
+    # commands work while the reader owns the port
+    sim.corrupt_rate = 0.0
+    assert streaming.set_v_out(5)
+    assert streaming.get_status(refresh=True).v_set == 5.0
+
+
+def test_reader_death_stops_streaming(streaming, sim):
+    sim.stop()
+    deadline = time.monotonic() + 1.0
+    while streaming.is_streaming() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert not streaming.is_streaming()
+    t = time.monotonic()
+    assert streaming.wait_report(lambda s: True, streaming.ring.count(), 1.0) is None
+    assert time.monotonic() - t < 0.1
+
+
+def test_setpoint_cache_skips_repeats(streaming, sim):
+    assert streaming.set_v_out(5)
+    assert streaming.set_v_out(5)
+    assert streaming.stats.commands["V"] == 1
+    # a raw write drops the cached value
+    streaming.send("V0300")
+    assert "v_set" not in streaming.cache
+    time.sleep(0.05)  # the echo of a raw write is not waited for
+    assert streaming.set_v_out(5)
+    assert streaming.stats.commands["V"] == 3
+    assert sim.v_set == 5.0
+
+
+def test_background_setpoints_coalesce(streaming, sim):
+    for k in range(100):
+        streaming.set_v_out(k / 10, wait=False)
+    assert streaming.flush(2.0)
+    assert sim.v_set == 9.9 and streaming.cache["v_set"] == 9.9
+    assert streaming.stats.commands["V"] < 100
+
+
+def test_output_switch_latency(streaming, sim):
+    res = streaming.output_switch(True)
+    assert res["ok"] and res["state"].on_off == 1 and sim.on_off == 1
+    assert streaming.last_switch_latency == res["latency"] > 0
+    assert streaming.output_disable() and sim.on_off == 0
+
+
+def test_polled_output_switch(power, sim):
+    power.enable_state_reporting(streaming=False)
+    assert power.output_enable()
+    assert sim.on_off == 1
+    assert power.get_state().on_off == 1
+
+
+def test_pulse_train_edges(streaming, sim):
+    from dc6006l_sequence import pulse_train
+    res = pulse_train(streaming, 0.1, 0.05, 3, voltage=5)
+    assert [on for _, on in res["edges"]] == [1, 0] * 3
+    assert all(abs(w - 0.1) <= 0.03 for w in res["on_widths"])  # report period 10 ms
+    assert sim.on_off == 0
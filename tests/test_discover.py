@@ -0,0 +1,22 @@
+import time
+
+from dc6006l_discover import probe
+
+
+def test_probe_starts_and_stops_reporting(sim):
+    assert probe(sim.port) == "status"
+    deadline = time.monotonic() + 0.5
+    while sim.reporting and time.monotonic() < deadline:
+        time.sleep(0.005)  # "W" is written, the simulator reads it a little later
+    assert not sim.reporting
+
+
+def test_probe_leaves_reporting_supply_alone(sim):
+    sim.reporting = True
+    assert probe(sim.port) == "report"
+    assert sim.reporting and sim.commands == 0
+
+
+def test_probe_skips_busy_port(power, sim):
+    assert probe(sim.port) is None
+    assert sim.commands == 0
@@ -0,0 +1,45 @@
+import math
+import time
+
+import pytest
+
+from dc6006l_sequence import compile_sequence, play_sequence
+
+
+class fake_power:
+    # records commands, every write takes delay seconds
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.cmds = []
+        self.ring = None
+
+    def send(self, cmd):
+        time.sleep(self.delay)
+        self.cmds.append(cmd)
+
+    def query_frame(self, cmd, kind="echo", timeout=None):
+        self.send(cmd)
+        return "0000A0000A"
+
+
+def test_skipped_step_is_carried():
+    seq = compile_sequence([(0, 5, 1, 1), (0.05, 0, 1, None), (0.1, 0, 2, None), (0.5, None, None, 0)])
+    # step 2 repeats V0 of step 1, it is dropped by compile_sequence
+    assert seq[2][1] == ["I2000"]
+    power = fake_power(delay=0.1)
+    res = play_sequence(power, seq, max_late=0.05)
+    assert res["late"][1] is None and res["late"][2] is None and res["late"][3] is not None
+    # the late V0 goes out with the next played step
+    assert power.cmds == ["V0500", "I1000", "N", "V0000", "I2000", "F"]
+
+
+def test_skipped_last_step_is_played_at_the_end():
+    power = fake_power(delay=0.05)
+    res = play_sequence(power, compile_sequence([(0, 5, None, 1), (0.01, 3, None, 0)]), max_late=0.02)
+    assert res["skipped"] == 2
+    assert power.cmds == ["V0500", "N", "V0300", "F"]
+
+
+def test_nan_time_is_rejected():
+    with pytest.raises(ValueError):
+        compile_sequence([(0, 5, 1, 1), (math.nan, 0, None, None)])
@@ -0,0 +1,48 @@
+import numpy as np
+
+import dc6006l_class as ps
+from dc6006l_sweep import knees, sweep, wait_settled
+
+
+def state(v, i, cv_cc=0, t=0.0):
+    return ps.State(v, i, v * i, 0, 30, cv_cc, 0, 1, t)
+
+
+class replay_power:
+    # wait_report() over a fixed list of samples
+    def __init__(self, samples):
+        self.samples = samples
+
+    def wait_report(self, match, seq, timeout):
+        for sample in self.samples[seq:]:
+            if match(sample):
+                return sample
+        return None
+
+
+def test_stale_frames_are_not_settled():
+    prev = state(2.0, 0.2)
+    # three frames still at the previous point, then the output moves to 4 V
+    samples = [state(2.0, 0.2, t=k) for k in range(3)] + [state(v, v / 10, t=3 + k)
+                                                          for k, v in enumerate((3.1, 4.0, 4.0, 4.0))]
+    sample, settled, settle_time = wait_settled(replay_power(samples), 0, 0.0, n_stable=3,
+                                                setpoint=4.0, prev=prev)
+    assert settled and sample.v_out == 4.0 and settle_time == 4.0
+    # without the setpoint the stale frames pass as settled
+    assert wait_settled(replay_power(samples), 0, 0.0, n_stable=3)[0].v_out == 2.0
+
+
+def test_plateau_held_by_the_other_limit_settles():
+    prev = state(4.37, 0.437, cv_cc=1)
+    samples = [state(4.37, 0.437, cv_cc=1, t=k) for k in range(3)]
+    assert wait_settled(replay_power(samples), 0, 0.0, n_stable=3, setpoint=6.0, prev=prev)[1]
+
+
+def test_sweep_finds_the_knee(streaming, sim):
+    assert streaming.set_v_out(0) and streaming.set_i_out(0.437) and streaming.output_enable()
+    curve = sweep(streaming, np.arange(0, 8.01, 1.0), refine=8)
+    assert curve["settled"].all()
+    assert list(curve["setpoint"]) == sorted(curve["setpoint"])
+    knee = knees(curve)
+    assert len(knee) == 1 and abs(knee[0] - 4.37) <= 0.02
+    assert (curve["cv_cc"][curve["setpoint"] > 4.4] == 1).all()
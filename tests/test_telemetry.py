@@ -0,0 +1,54 @@
+import time
+
+import dc6006l_class as ps
+from dc6006l_accum import telemetry_accumulator
+from dc6006l_recorder import open_recording, telemetry_recorder
+
+
+class ring_source:
+    def __init__(self, size):
+        self.ring = ps.state_ring(size)
+
+
+def sample(k):
+    return ps.State(5.0, 0.5, 2.5, 0, 30, 0, 0, 1, 1000.0 + k * 0.01)
+
+
+def test_ring_follower_counts_lost_samples():
+    source = ring_source(8)
+    got = []
+    lost = []
+    follower = ps.ring_follower(source, lambda s, n: (got.extend(s), lost.append(n)), period=0.05)
+    for k in range(20):
+        source.ring.push(sample(k))
+    follower.stop()
+    # ring keeps size - 1 readable samples
+    assert got == [sample(k) for k in range(13, 20)]
+    assert sum(lost) == 13
+
+
+def test_recorder_and_accumulator_follow_streaming(streaming, sim, tmp_path):
+    sim.on_off, sim.v_set, sim.i_set = 1, 5.0, 1.0
+    path = str(tmp_path / "run.dcl")
+    rec = telemetry_recorder(path)
+    acc = telemetry_accumulator(window=1.0)
+    # reports pause while both are attached, so they see the same samples
+    sim.reporting = False
+    time.sleep(0.05)
+    seq = streaming.ring.count()
+    rec.attach(streaming, period=0.02)
+    acc.attach(streaming, period=0.02)
+    sim.reporting = True
+    time.sleep(0.3)
+    sim.reporting = False
+    time.sleep(0.05)
+    rec.detach()
+    acc.detach()
+    rec.close()
+    data = open_recording(path)
+    snap = acc.snapshot()
+    samples = streaming.ring.read_from(seq)[0]
+    assert len(data) == snap["samples"] == len(samples) > 10
+    assert rec.lost == snap["lost"] == 0
+    assert list(data["timestamp"]) == [s.timestamp for s in samples]
+    assert snap["total"]["v_out"]["max"] == 5.0
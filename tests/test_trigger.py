@@ -0,0 +1,51 @@
+import threading
+import time
+
+import dc6006l_class as ps
+from dc6006l_trigger import error_code, mode_change, rate, threshold, trigger_engine
+
+
+def state(v, i, cv_cc=0, error=0, t=0.0):
+    return ps.State(v, i, v * i, 0, 30, cv_cc, error, 1, t)
+
+
+def test_threshold_hysteresis():
+    cond = threshold("i_out", 0.5, "above", hysteresis=0.1)
+    hits = [cond(None, state(5, i)) for i in (0.4, 0.6, 0.45, 0.6, 0.3, 0.6)]
+    assert hits == [False, True, False, False, False, True]
+
+
+def test_conditions():
+    assert mode_change("cc")(state(5, 1, 0), state(4, 1, 1))
+    assert not mode_change("cc")(state(4, 1, 1), state(5, 1, 0))
+    assert error_code(("oc",))(state(5, 1), state(0, 0, error=2))
+    assert not error_code(("ov",))(state(5, 1), state(0, 0, error=2))
+    assert rate("v_out", 10)(state(0, 0, t=0.0), state(2, 0, t=0.1))
+    assert not rate("v_out", 10, "fall")(state(0, 0, t=0.0), state(2, 0, t=0.1))
+
+
+def test_engine_disables_output_and_captures(streaming, sim):
+    fired = threading.Event()
+    engine = trigger_engine(streaming)
+    engine.add(threshold("i_out", 0.3), action="output_disable", pre=3, post=3, once=True, name="oc")
+    engine.add(mode_change("cc"), action=lambda event: fired.set())
+    assert engine.attach()
+    try:
+        assert streaming.set_v_out(5) and streaming.set_i_out(1.0)
+        streaming.send("N")
+        deadline = time.monotonic() + 1.0
+        while not engine.events and time.monotonic() < deadline:
+            time.sleep(0.01)
+        event = engine.events[0]
+        assert event["name"] == "oc" and event["sample"].i_out > 0.3
+        assert not fired.is_set()
+        assert len(event["pre"]) == 3 and len(event["post"]) == 3
+        assert sim.on_off == 0
+        # the condition fired once and was removed
+        assert [t["name"] for t in engine.triggers] == ["trigger1"]
+        streaming.set_i_out(0.2)
+        streaming.send("N")
+        assert fired.wait(1.0)
+    finally:
+        engine.detach()
+    assert engine._on_report not in streaming.report_hooks